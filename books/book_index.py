@@ -0,0 +1,146 @@
+"""
+In-process bitmap index of the catalog filters.
+
+Every filter value (a subcategory under its parent, a top-level
+category, a language, a cover or illustration type) maps to the set of
+its book ids, held as a Python int with bit n set for book n. A filter
+combination is then resolved by OR-ing the bitsets of the values chosen
+within a filter and AND-ing across filters, and the books are fetched
+with one pk__in query instead of joining the categories table.
+
+Each process builds its index from two queries and keeps it for the
+current catalog version (see books.page_cache). Changes made in this
+process are applied to the index book by book as the version moves on
+(see books.signals), changes made elsewhere make it rebuild.
+"""
+
+import threading
+from collections import defaultdict
+
+from .models import Book
+from .page_cache import catalog_caches_enabled, get_catalog_version
+
+# Above this many matches a pk__in list costs more than the joins
+MAX_SELECTED = 10000
+
+_lock = threading.Lock()
+_index = None
+_changed_books = set()
+
+
+def book_keys(language, cover_type, illustration_type):
+    return {
+        ("language", language),
+        ("cover", cover_type),
+        ("illustration", illustration_type),
+    }
+
+
+def category_keys(category_id, parent_id):
+    return {("subcategory", category_id, parent_id), ("category", parent_id)}
+
+
+def bit_ids(bits):
+    """The positions of the set bits of an int, in ascending order"""
+    return [i for i, bit in enumerate(reversed(bin(bits))) if bit == "1"]
+
+
+class BookIndex:
+    def __init__(self, version):
+        self.version = version
+        self.bits = defaultdict(int)
+        # Book id -> the keys it is set in
+        self.keys = defaultdict(set)
+
+    def _load(self, books):
+        """Add the keys of books, a Book queryset"""
+        for pk, language, cover_type, illustration_type in books.values_list(
+            "pk", "language", "cover_type", "illustration_type"
+        ):
+            self.keys[pk] |= book_keys(language, cover_type, illustration_type)
+        for book_id, category_id, parent_id in Book.categories.through.objects.filter(
+            book__in=books
+        ).values_list("book_id", "category_id", "category__parent_id"):
+            self.keys[book_id] |= category_keys(category_id, parent_id)
+
+    def _set_bits(self, book_ids):
+        for book_id in book_ids:
+            for key in self.keys.get(book_id, ()):
+                self.bits[key] |= 1 << book_id
+
+    @classmethod
+    def build(cls, version):
+        index = cls(version)
+        index._load(Book.objects.all())
+        index._set_bits(index.keys)
+        return index
+
+    def update(self, book_ids):
+        """Reload the keys of changed, added or deleted books"""
+        if not book_ids:
+            return
+        for book_id in book_ids:
+            for key in self.keys.pop(book_id, ()):
+                self.bits[key] &= ~(1 << book_id)
+        self._load(Book.objects.filter(pk__in=book_ids))
+        self._set_bits(book_ids)
+
+    def select(self, filters):
+        """
+        The ids of the books matching every filter, each a list of keys
+        of which a book needs any one
+        """
+        selected = None
+        for keys in filters:
+            bits = 0
+            for key in keys:
+                bits |= self.bits.get(key, 0)
+            selected = bits if selected is None else selected & bits
+        return bit_ids(selected)
+
+
+def select_books(filters):
+    """
+    The ids of the books matching the filters, see BookIndex.select, or
+    None when there are no filters, too many books match or the index
+    cannot be kept (see books.page_cache)
+    """
+    global _index
+    if not filters or not catalog_caches_enabled():
+        return None
+    version = get_catalog_version()
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = BookIndex.build(version)
+        book_ids = _index.select(filters)
+    return book_ids if len(book_ids) <= MAX_SELECTED else None
+
+
+def mark_changed(book_ids):
+    """Record books to update on the next follow_version()"""
+    with _lock:
+        _changed_books.update(book_ids)
+
+
+def follow_version(previous, version):
+    """
+    Move the index from the previous catalog version to the next one,
+    applying the changes marked since. An index that missed a version
+    is dropped and rebuilt on next use.
+    """
+    global _index
+    with _lock:
+        book_ids = list(_changed_books)
+        _changed_books.clear()
+        if _index is not None and _index.version == previous:
+            _index.update(book_ids)
+            _index.version = version
+        else:
+            _index = None
+
+
+def drop_index():
+    """Rebuild the index on next use, e.g. after categories moved"""
+    global _index
+    with _lock:
+        _index = None
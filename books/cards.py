@@ -0,0 +1,152 @@
+"""
+Catalog cards: the BookCard read model and the cache of rendered cards.
+
+Every book has a BookCard row holding what its card shows, the author
+names included, written by save_book_cards() whenever books.signals
+sees the book, its authors or its categories change. Browsing pages
+through these rows, searching pages through books and loads the rows
+of the cards it has to render.
+
+Rendered cards are cached under the book's card_version, which books.signals
+increments whenever the book, its authors or its publisher change, so
+stale cards are simply never looked up again. The per-request parts of
+a card, the CSRF token and the page the add-to-cart form returns to,
+are cached as placeholders and filled in when the cards are rendered.
+"""
+
+from django.core.cache import cache
+from django.db.models import F, Prefetch
+from django.template.loader import get_template
+from django.utils.html import escape
+
+from .models import Book, BookCard
+
+CARD_TEMPLATE = "includes/book_card.html"
+CARD_TIMEOUT = 60 * 60 * 24
+BATCH_SIZE = 500
+
+# Copied from the book as they are
+BOOK_CARD_FIELDS = (
+    "slug",
+    "title",
+    "price",
+    "image",
+    "image_variants",
+    "language",
+    "cover_type",
+    "illustration_type",
+    "available",
+    "card_version",
+    "sales_count",
+    "popularity",
+)
+
+CSRF_PLACEHOLDER = "__card_csrf_token__"
+REDIRECT_PLACEHOLDER = "__card_redirect_url__"
+
+
+def bump_card_versions(books):
+    """Make the cached cards of a book queryset stale"""
+    books.update(card_version=F("card_version") + 1)
+
+
+def save_book_cards(books, card_model=BookCard):
+    """
+    Create or update the BookCard rows of a book queryset. Migrations
+    pass their historical models.
+    """
+    authors = books.model._meta.get_field("authors").related_model.objects.only(
+        "id", "name"
+    )
+    books = books.order_by("pk").prefetch_related(
+        Prefetch("authors", queryset=authors)
+    )
+    through = books.model.categories.through.objects
+    fields = BOOK_CARD_FIELDS + ("author_names", "category_ids")
+
+    for start in range(0, books.count(), BATCH_SIZE):
+        batch = list(books[start : start + BATCH_SIZE])
+        category_ids = {}
+        for book_id, category_id in through.filter(
+            book_id__in=[book.pk for book in batch]
+        ).values_list("book_id", "category_id"):
+            category_ids.setdefault(book_id, []).append(category_id)
+
+        cards = [
+            card_model(
+                id=book.pk,
+                author_names=", ".join(author.name for author in book.authors.all()),
+                category_ids=sorted(category_ids.get(book.pk, [])),
+                **{field: getattr(book, field) for field in BOOK_CARD_FIELDS},
+            )
+            for book in batch
+        ]
+        card_model.objects.bulk_create(
+            cards, update_conflicts=True, unique_fields=["id"], update_fields=fields
+        )
+
+
+def delete_book_cards(book_ids):
+    BookCard.objects.filter(pk__in=book_ids).delete()
+
+
+def load_cards(books):
+    """
+    The BookCard rows of a list of books, by id, writing those that are
+    missing
+    """
+    ids = [book.pk for book in books]
+    cards = BookCard.objects.in_bulk(ids)
+    if len(cards) < len(ids):
+        save_book_cards(Book.objects.filter(pk__in=set(ids) - set(cards)))
+        cards = BookCard.objects.in_bulk(ids)
+    return cards
+
+
+def _card_variant(header_deferred, user):
+    # Superusers see edit buttons instead of "Add to cart", and pages
+    # from the page cache have both
+    if header_deferred:
+        return "deferred"
+    return "superuser" if user.is_superuser else "customer"
+
+
+def _card_key(book, variant):
+    return f"books:card:{book.pk}:{book.card_version}:{variant}"
+
+
+def render_cards(books, header_deferred, user, csrf_token, redirect_path):
+    """
+    The HTML of the cards of a list of books or BookCards. Only the
+    cards missing from the cache are rendered, and only the BookCards of
+    those are loaded when books are given.
+    """
+    variant = _card_variant(header_deferred, user)
+    keys = {book.pk: _card_key(book, variant) for book in books}
+    cached = cache.get_many(keys.values())
+
+    missing = [book for book in books if keys[book.pk] not in cached]
+    if missing:
+        if not isinstance(missing[0], BookCard):
+            cards = load_cards(missing)
+            missing = [cards[book.pk] for book in missing if book.pk in cards]
+        template = get_template(CARD_TEMPLATE)
+        rendered = {
+            keys[card.pk]: template.render(
+                {
+                    "book": card,
+                    "header_deferred": header_deferred,
+                    "header_user": user,
+                    "csrf_token": CSRF_PLACEHOLDER,
+                    "redirect_path": REDIRECT_PLACEHOLDER,
+                }
+            )
+            for card in missing
+        }
+        cache.set_many(rendered, CARD_TIMEOUT)
+        cached.update(rendered)
+
+    html = "".join(cached.get(keys[book.pk], "") for book in books)
+    return html.replace(CSRF_PLACEHOLDER, str(csrf_token)).replace(
+        REDIRECT_PLACEHOLDER, escape(redirect_path)
+    )
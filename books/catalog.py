@@ -0,0 +1,229 @@
+import re
+
+from django.db.models import Exists, OuterRef, Q
+from django.utils.http import urlencode
+
+from . import book_index, fuzzy, search
+from .models import Book, BookCard, Category
+from .pagination import SORT_ORDERINGS, paginate_books
+
+LANGUAGES = ["ukr", "eng"]
+COVER_TYPES = [code for code, label in Book.COVER_CHOICES]
+ILLUSTRATION_TYPES = [code for code, label in Book.ILLUSTRATION_CHOICES]
+
+# Parameters that select books, as opposed to sorting or paging them
+FILTER_PARAMS = (
+    "q",
+    "category",
+    "subcategory",
+    "parent",
+    "language",
+    "cover",
+    "illustration",
+    "price",
+)
+
+# Price filter values: (key, label, lower bound, upper bound or None)
+PRICE_BUCKETS = (
+    ("0-10", "Under £10", 0, 10),
+    ("10-20", "£10 to £20", 10, 20),
+    ("20-30", "£20 to £30", 20, 30),
+    ("30-", "£30 and over", 30, None),
+)
+
+# Columns needed to page through search results, see books.cards
+PAGE_FIELDS = ("id", "price", "sales_count", "popularity", "card_version")
+
+
+def price_condition(low, high):
+    """Books priced from low up to, but not including, high"""
+    condition = Q(price__gte=low)
+    if high is not None:
+        condition &= Q(price__lt=high)
+    return condition
+
+
+class InvalidCatalogQuery(ValueError):
+    """Raised when the catalog filters in the request cannot be parsed"""
+
+
+class CatalogQuery:
+    """
+    Parse the catalog filters (category, subcategory, search words,
+    language, cover and illustration type, price and sort option) from
+    request parameters and build a single book queryset for them.
+
+    Search words go through the full-text index when the database has
+    one (see books.search). Other filters on many-to-many relations are
+    expressed as EXISTS subqueries, so a book matches at most once however
+    many categories or authors satisfy the filter, and every search word
+    adds a condition rather than another join. Without search words, the
+    category and attribute filters are resolved in memory instead (see
+    books.book_index).
+    """
+
+    def __init__(self, params):
+        self.search_term = None
+        self.words = []
+        # Whether the words are matched by similarity, see paginate()
+        self.fuzzy = False
+        self.current_categories = None
+        self.sort_option = params.get("sort")
+        self.language = params.get("language")
+        self.cover = params.get("cover")
+        self.illustration = params.get("illustration")
+        self.price = params.get("price")
+        self.category_ids = []
+        self._category_filter = None
+        self._category_keys = None
+        # The parameters that select the books, in a stable order
+        self.signature = urlencode(
+            sorted((key, params[key]) for key in FILTER_PARAMS if key in params)
+        )
+
+        if "subcategory" in params and "parent" in params:
+            try:
+                subcategory_id = int(params["subcategory"])
+                parent_id = int(params["parent"])
+            except ValueError:
+                raise InvalidCatalogQuery("Invalid category selection")
+            self._category_filter = Q(
+                category_id=subcategory_id, category__parent_id=parent_id
+            )
+            self._category_keys = [("subcategory", subcategory_id, parent_id)]
+            self.category_ids = [subcategory_id]
+            self.current_categories = Category.objects.filter(id=subcategory_id)
+
+        elif "category" in params:
+            try:
+                category_ids = [int(cid) for cid in params["category"].split(",")]
+            except ValueError:
+                raise InvalidCatalogQuery("Invalid category selection")
+            # Books are tagged with subcategories of the selected categories
+            self._category_filter = Q(category__parent_id__in=category_ids)
+            self._category_keys = [("category", cid) for cid in category_ids]
+            self.category_ids = category_ids
+            self.current_categories = Category.objects.filter(id__in=category_ids)
+
+        if "q" in params:
+            self.search_term = params["q"]
+            if not self.search_term.strip():
+                raise InvalidCatalogQuery("Enter your search criteria")
+            self.words = re.findall(r"\w+", self.search_term.lower())
+
+    @property
+    def sort_key(self):
+        """The sort option to paginate by, relevance by default for searches"""
+        ranked = bool(self.words) and (self.fuzzy or search.is_available())
+        if self.sort_option == "relevance" or self.sort_option not in SORT_ORDERINGS:
+            return "relevance" if ranked else None
+        return self.sort_option
+
+    def _word_condition(self, word):
+        """A book matches a word if any of its searchable fields contains it"""
+        author_match = Book.authors.through.objects.filter(
+            book_id=OuterRef("pk"), bookcontributor__name__icontains=word
+        )
+        return (
+            Q(title__icontains=word)
+            | Q(description__icontains=word)
+            | Q(publisher__name__icontains=word)
+            | Exists(author_match)
+        )
+
+    def search(self, books=None):
+        """
+        Apply the search words to a book queryset. Without search words
+        the catalog is browsed through the BookCard table by default.
+        """
+        if not self.words:
+            return BookCard.objects.all() if books is None else books
+        if books is None:
+            books = Book.objects.all()
+        if self.fuzzy:
+            return fuzzy.search(books, self.search_term)
+        if search.is_available():
+            return search.search(books, self.search_term)
+        return books.filter(*(self._word_condition(word) for word in self.words))
+
+    def facet_conditions(self):
+        """
+        The conditions of the filters that have facet counts (see
+        books.facets), by facet name
+        """
+        conditions = {}
+        if self._category_filter is not None:
+            conditions["category"] = Exists(
+                Book.categories.through.objects.filter(
+                    self._category_filter, book_id=OuterRef("pk")
+                )
+            )
+        if self.language in LANGUAGES:
+            conditions["language"] = Q(language=self.language)
+        if self.cover in COVER_TYPES:
+            conditions["cover"] = Q(cover_type=self.cover)
+        if self.illustration in ILLUSTRATION_TYPES:
+            conditions["illustration"] = Q(illustration_type=self.illustration)
+        for key, label, low, high in PRICE_BUCKETS:
+            if self.price == key:
+                conditions["price"] = price_condition(low, high)
+        return conditions
+
+    def index_filters(self):
+        """
+        The facet conditions that books.book_index can resolve, as its
+        lists of keys, by facet name
+        """
+        filters = {}
+        if self._category_keys:
+            filters["category"] = self._category_keys
+        if self.language in LANGUAGES:
+            filters["language"] = [("language", self.language)]
+        if self.cover in COVER_TYPES:
+            filters["cover"] = [("cover", self.cover)]
+        if self.illustration in ILLUSTRATION_TYPES:
+            filters["illustration"] = [("illustration", self.illustration)]
+        return filters
+
+    def filter(self, books=None):
+        """Apply the filters to a book queryset"""
+        conditions = self.facet_conditions()
+        books = self.search(books)
+        if not self.words:
+            # Browsing without search words: resolve what the bitmap
+            # index can in memory and fetch the books by id
+            index_filters = self.index_filters()
+            book_ids = book_index.select_books(list(index_filters.values()))
+            if book_ids is not None:
+                for name in index_filters:
+                    del conditions[name]
+                books = books.filter(pk__in=book_ids)
+        # The facet conditions are on book (or BookCard) columns or
+        # EXISTS subqueries, so they add no joins to the search
+        return books.filter(*conditions.values())
+
+    def books(self):
+        """
+        What to page through: BookCards when browsing, which render
+        without further queries, and when searching books with only the
+        columns paging needs, whose cards books.cards loads when needed.
+        """
+        if self.words:
+            return self.filter().only(*PAGE_FIELDS)
+        return self.filter()
+
+    def paginate(self, cursor=None):
+        """
+        A page of the books and the cursor of the next one, see
+        books.pagination.paginate_books.
+
+        Search words that match no book as typed, misspelled or in the
+        other script, are matched by similarity instead (see books.fuzzy).
+        Only an empty page is checked for that: a page that has books
+        needs no other query.
+        """
+        page, next_cursor = paginate_books(self.books(), self.sort_key, cursor)
+        if not page and self.words and not self.fuzzy and not self.search().exists():
+            self.fuzzy = True
+            page, next_cursor = paginate_books(self.books(), self.sort_key, cursor)
+        return page, next_cursor
@@ -0,0 +1,50 @@
+from collections import defaultdict
+
+from django.core.cache import cache
+
+from .models import Category
+
+CACHE_KEY = "books:category_tree"
+CACHE_TIMEOUT = 60 * 60
+
+
+class CategoryTree:
+    """
+    The active top-level categories, each with its active subcategories
+    in visible_subcategories, as shown in the catalog navigation.
+
+    The tree is built from a single query and kept in the cache until
+    a category changes (see books.signals).
+    """
+
+    def __init__(self, categories):
+        self.categories = categories
+
+    def __iter__(self):
+        return iter(self.categories)
+
+    @classmethod
+    def build(cls):
+        subcategories = defaultdict(list)
+        parents = []
+        for category in Category.objects.filter(active=True).order_by("order"):
+            if category.parent_id is None:
+                parents.append(category)
+            else:
+                subcategories[category.parent_id].append(category)
+
+        for category in parents:
+            category.visible_subcategories = subcategories[category.id]
+        return cls(parents)
+
+    @classmethod
+    def get(cls):
+        tree = cache.get(CACHE_KEY)
+        if tree is None:
+            tree = cls.build()
+            cache.set(CACHE_KEY, tree, CACHE_TIMEOUT)
+        return tree
+
+    @staticmethod
+    def invalidate():
+        cache.delete(CACHE_KEY)
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+from .page_cache import cache_is_shared
+
+SHARED_CACHE_WARNING = (
+    "The default cache is local to each process, so catalog changes would "
+    "only reach the process that made them. Catalog pages, facet counts "
+    "and the filter, suggestion and fuzzy search indexes are not cached."
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """The catalog version in books.page_cache needs a cache every process sees"""
+    if settings.DEBUG or cache_is_shared():
+        return []
+    return [Warning(SHARED_CACHE_WARNING, hint="Set REDIS_URL.", id="books.W001")]
@@ -0,0 +1,133 @@
+"""
+Streaming CSV and JSON lines exports.
+
+Records are read with QuerySet.iterator(), which uses a server-side
+cursor on PostgreSQL, and their related rows are prefetched one chunk
+at a time with separate IN queries instead of joins. Lines are yielded
+as soon as each chunk is read, so an export starts at once and its
+memory use does not depend on the number of rows.
+
+The book export has the columns of the import_catalog command, so its
+files can be imported again.
+"""
+
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Book, BookContributor, Category, Publisher
+
+CHUNK_SIZE = 1000
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
+
+BOOK_COLUMNS = (
+    "id",
+    "sku",
+    "slug",
+    "title",
+    "price",
+    "pages",
+    "cover_type",
+    "illustration_type",
+    "language",
+    "dimensions",
+    "weight",
+    "stock_quantity",
+    "available",
+    "image_url",
+    "description",
+    "publisher",
+    "authors",
+    "illustrators",
+    "categories",
+)
+M2M_COLUMNS = ("authors", "illustrators", "categories")
+
+
+class Echo:
+    """A file-like object that returns what is written to it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records, columns):
+    """CSV lines of records, list values separated by semicolons"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for record in records:
+        yield writer.writerow(
+            [
+                "; ".join(map(str, value)) if isinstance(value, list) else value
+                for value in (record.get(column) for column in columns)
+            ]
+        )
+
+
+def jsonl_lines(records):
+    for record in records:
+        yield json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+def export_lines(records, columns, file_format):
+    """The lines of an export file, in one of EXPORT_FORMATS"""
+    if file_format == "csv":
+        return csv_lines(records, columns)
+    return jsonl_lines(records)
+
+
+def export_response(lines, name, file_format):
+    """A download streaming the lines of an export file"""
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[file_format])
+    filename = f"{name}-{timezone.localdate():%Y-%m-%d}.{file_format}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def book_records(books=None, chunk_size=CHUNK_SIZE):
+    """Yield a dict per book, with its publisher and contributors"""
+    if books is None:
+        books = Book.objects.all()
+    names = BookContributor.objects.only("name")
+    books = (
+        books.order_by("pk")
+        .only(*[column for column in BOOK_COLUMNS if column not in M2M_COLUMNS])
+        .prefetch_related(
+            Prefetch("publisher", queryset=Publisher.objects.only("name")),
+            Prefetch("authors", queryset=names),
+            Prefetch("illustrators", queryset=names),
+            Prefetch("categories", queryset=Category.objects.only("pk")),
+        )
+    )
+    for book in books.iterator(chunk_size=chunk_size):
+        yield {
+            "id": book.pk,
+            "sku": book.sku,
+            "slug": book.slug,
+            "title": book.title,
+            "price": book.price,
+            "pages": book.pages,
+            "cover_type": book.cover_type,
+            "illustration_type": book.illustration_type,
+            "language": book.language,
+            "dimensions": book.dimensions,
+            "weight": book.weight,
+            "stock_quantity": book.stock_quantity,
+            "available": book.available,
+            "image_url": book.image_url,
+            "description": book.description,
+            "publisher": book.publisher.name if book.publisher else None,
+            "authors": [author.name for author in book.authors.all()],
+            "illustrators": [
+                illustrator.name for illustrator in book.illustrators.all()
+            ],
+            "categories": [category.pk for category in book.categories.all()],
+        }
@@ -0,0 +1,126 @@
+"""
+Facet counts for the catalog filters.
+
+All counts come from one aggregate query over the books matching the
+search words, with a conditional COUNT per facet value. Each count
+applies the other active filters but not its own dimension's, so the
+sidebar shows how many books each choice would give. Results are
+cached per filter signature under the catalog version (see
+books.page_cache), which any catalog change moves forward.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .catalog import COVER_TYPES, LANGUAGES, PRICE_BUCKETS, price_condition
+from .models import Book
+from .page_cache import catalog_caches_enabled, get_catalog_version
+
+FACETS_TIMEOUT = 60 * 60
+
+
+class Facets:
+    """
+    The counts of a catalog query: total, and per category id, language,
+    cover type and price bucket key
+    """
+
+    def __init__(self, total, categories, languages, covers, prices):
+        self.total = total
+        self.categories = categories
+        self.languages = languages
+        self.covers = covers
+        self.prices = prices
+
+    def category(self, category_id):
+        return self.categories.get(category_id, 0)
+
+    # (value, label, count) of each choice, in display order
+
+    @property
+    def language_options(self):
+        labels = dict(Book.LANGUAGE_CHOICES)
+        return [(code, labels[code], self.languages.get(code, 0)) for code in LANGUAGES]
+
+    @property
+    def cover_options(self):
+        return [
+            (code, label, self.covers.get(code, 0))
+            for code, label in Book.COVER_CHOICES
+        ]
+
+    @property
+    def price_options(self):
+        return [
+            (key, label, self.prices.get(key, 0))
+            for key, label, low, high in PRICE_BUCKETS
+        ]
+
+    @classmethod
+    def count(cls, catalog, category_tree):
+        conditions = catalog.facet_conditions()
+
+        def count_if(dimension, condition):
+            others = [c for d, c in conditions.items() if d != dimension]
+            return Count("pk", filter=Q(condition, *others))
+
+        through = Book.categories.through.objects
+        aggregates = {"total": Count("pk", filter=Q(*conditions.values()))}
+        for category in category_tree:
+            aggregates[f"category_{category.id}"] = count_if(
+                "category",
+                Exists(
+                    through.filter(
+                        book_id=OuterRef("pk"), category__parent_id=category.id
+                    )
+                ),
+            )
+            for subcategory in category.visible_subcategories:
+                aggregates[f"category_{subcategory.id}"] = count_if(
+                    "category",
+                    Exists(
+                        through.filter(
+                            book_id=OuterRef("pk"), category_id=subcategory.id
+                        )
+                    ),
+                )
+        for language in LANGUAGES:
+            aggregates[f"language_{language}"] = count_if(
+                "language", Q(language=language)
+            )
+        for cover in COVER_TYPES:
+            aggregates[f"cover_{cover}"] = count_if("cover", Q(cover_type=cover))
+        for key, label, low, high in PRICE_BUCKETS:
+            aggregates[f"price_{key}"] = count_if("price", price_condition(low, high))
+
+        row = catalog.search().aggregate(**aggregates)
+
+        def values(prefix, convert=str):
+            return {
+                convert(name[len(prefix) :]): count
+                for name, count in row.items()
+                if name.startswith(prefix)
+            }
+
+        return cls(
+            total=row["total"],
+            categories=values("category_", int),
+            languages=values("language_"),
+            covers=values("cover_"),
+            prices=values("price_"),
+        )
+
+    @classmethod
+    def get(cls, catalog, category_tree):
+        """The counts of a catalog query, from the cache when possible"""
+        if not catalog_caches_enabled():
+            return cls.count(catalog, category_tree)
+        digest = hashlib.md5(catalog.signature.encode()).hexdigest()
+        key = f"books:facets:{get_catalog_version()}:{digest}"
+        facets = cache.get(key)
+        if facets is None:
+            facets = cls.count(catalog, category_tree)
+            cache.set(key, facets, FACETS_TIMEOUT)
+        return facets
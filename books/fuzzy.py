@@ -0,0 +1,187 @@
+"""
+Typo-tolerant search over book titles and author names.
+
+Used by books.catalog when a search finds nothing as typed. Every book
+keeps its title and author names in Book.search_names, transliterated
+to Latin script and folded so that the common spellings of the same
+sound compare equal: "Шевченко", "Shevchenko" and "Schevchenko" all
+come out close. Queries are folded the same way and matched by trigram
+word similarity.
+
+On PostgreSQL this is pg_trgm's %> operator, backed by a GIN trigram
+index on search_names. Elsewhere each process keeps an inverted index
+from trigram to book ids, rebuilt when the catalog version (see
+books.page_cache) moves on, so neither database scans every book.
+"""
+
+import re
+import threading
+from collections import Counter
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+
+from .models import Book
+from .page_cache import catalog_caches_enabled, get_catalog_version
+
+# pg_trgm's default pg_trgm.word_similarity_threshold
+WORD_SIMILARITY_THRESHOLD = 0.6
+# Most fuzzy matches to rank without PostgreSQL
+FUZZY_LIMIT = 200
+BATCH_SIZE = 500
+
+# Ukrainian national transliteration (2010), plus the Russian letters
+# customers may type
+TRANSLITERATION = str.maketrans(
+    {
+        "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d",
+        "е": "e", "є": "ie", "ж": "zh", "з": "z", "и": "y", "і": "i",
+        "ї": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n",
+        "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+        "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh",
+        "щ": "shch", "ь": "", "ю": "iu", "я": "ia", "ы": "y", "э": "e",
+        "ё": "io", "ъ": "", "'": "", "’": "", "ʼ": "",
+    }
+)  # fmt: skip
+
+# Applied after transliterating, so that other romanizations and
+# Russian-style spellings of Ukrainian names fold together
+LATIN_FOLDS = (
+    ("shch", "sch"),
+    ("kh", "h"),
+    ("g", "h"),
+    ("y", "i"),
+    ("j", "i"),
+    ("w", "v"),
+    ("x", "ks"),
+    ("q", "k"),
+)
+
+NON_WORD_RE = re.compile(r"[\W_]+")
+
+_lock = threading.Lock()
+_index = None
+
+
+def fold(text):
+    """Transliterate and fold text for fuzzy comparison"""
+    text = (text or "").lower().translate(TRANSLITERATION)
+    text = NON_WORD_RE.sub(" ", text)
+    for old, new in LATIN_FOLDS:
+        text = text.replace(old, new)
+    return " ".join(text.split())
+
+
+def trigrams(text):
+    """The trigrams of the words of folded text, padded like pg_trgm's"""
+    result = set()
+    for word in text.split():
+        padded = f"  {word} "
+        result.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def index_names(books):
+    """(Re)build the search_names of a book queryset"""
+    books = books.prefetch_related("authors")
+    batch = []
+    for book in books.iterator(chunk_size=BATCH_SIZE):
+        names = [book.title] + [author.name for author in book.authors.all()]
+        book.search_names = fold(" ".join(names))
+        batch.append(book)
+    books.model.objects.using(books.db).bulk_update(
+        batch, ["search_names"], batch_size=BATCH_SIZE
+    )
+
+
+class TrigramIndex:
+    def __init__(self, version):
+        self.version = version
+        # Trigram -> ids of the books having it
+        self.postings = {}
+
+    @classmethod
+    def build(cls, version):
+        index = cls(version)
+        for pk, search_names in Book.objects.values_list("pk", "search_names"):
+            for trigram in trigrams(search_names):
+                index.postings.setdefault(trigram, []).append(pk)
+        return index
+
+    def match(self, query):
+        """
+        {book id: similarity} of the best matches for a folded query.
+        The similarity is the share of the query's trigrams the book
+        has, an upper bound of pg_trgm's word similarity.
+        """
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return {}
+        counts = Counter()
+        for trigram in query_trigrams:
+            counts.update(self.postings.get(trigram, ()))
+        return {
+            pk: count / len(query_trigrams)
+            for pk, count in counts.most_common(FUZZY_LIMIT)
+            if count / len(query_trigrams) >= WORD_SIMILARITY_THRESHOLD
+        }
+
+
+def _get_index():
+    global _index
+    version = get_catalog_version()
+    if not catalog_caches_enabled():
+        # Only lasts for this search, see books.page_cache
+        return TrigramIndex.build(version)
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = TrigramIndex.build(version)
+        return _index
+
+
+def search(books, text):
+    """
+    Filter books to those whose title or author names are similar to
+    the search text, annotated with search_rank like books.search does
+    """
+    query = fold(text)
+
+    if connection.vendor == "postgresql":
+        return books.filter(search_names__trigram_word_similar=query).annotate(
+            search_rank=Cast(
+                TrigramWordSimilarity(query, F("search_names")), FloatField()
+            )
+        )
+
+    similarities = _get_index().match(query)
+    if not similarities:
+        # Still annotated, for the relevance ordering
+        return books.annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        ).none()
+    return books.filter(pk__in=list(similarities)).annotate(
+        search_rank=Case(
+            *(
+                When(pk=pk, then=Value(similarity))
+                for pk, similarity in similarities.items()
+            ),
+            output_field=FloatField(),
+        )
+    )
+
+
+def create_fuzzy_index(schema_editor):
+    """Create the trigram index on PostgreSQL"""
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS books_book_search_names_trgm "
+            "ON books_book USING GIN (search_names gin_trgm_ops)"
+        )
+
+
+def drop_fuzzy_index(schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS books_book_search_names_trgm")
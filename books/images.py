@@ -0,0 +1,95 @@
+"""
+Resized copies of uploaded book covers and contributor photos.
+
+Every uploaded image gets derivatives at a few widths in WebP, and in
+AVIF when Pillow supports it. They are saved through the image field's
+own storage, next to the original, and their names are recorded in a
+JSON field on the model so templates can build a srcset without asking
+the storage what exists.
+"""
+
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+DERIVATIVE_WIDTHS = (150, 300, 600)
+QUALITY = {"avif": 60, "webp": 80}
+
+
+def supports_format(fmt):
+    """
+    Whether Pillow can encode a format. AVIF is built in from Pillow
+    11.3, features.check() warns about the unknown feature before that.
+    """
+    return fmt in features.modules and features.check_module(fmt)
+
+
+# Best format first, templates list sources in this order
+FORMATS = [fmt for fmt in ("avif", "webp") if supports_format(fmt)]
+
+# Image field name -> field holding the names of its derivatives
+VARIANT_FIELDS = {"image": "image_variants", "photo": "photo_variants"}
+
+
+def derivative_name(name, width, fmt):
+    root = os.path.splitext(name)[0]
+    return f"{root}__w{width}.{fmt}"
+
+
+def _encode(image, width, fmt):
+    height = round(image.height * width / image.width)
+    resized = image.resize((width, height), Image.LANCZOS)
+    buffer = BytesIO()
+    resized.save(buffer, fmt.upper(), quality=QUALITY[fmt])
+    return ContentFile(buffer.getvalue())
+
+
+def delete_derivatives(storage, variants):
+    for fmt in FORMATS:
+        for name in variants.get(fmt, {}).values():
+            storage.delete(name)
+
+
+def generate_derivatives(field_file, old_variants=None):
+    """
+    Create the derivatives of an image and return the variants dict:
+    {"source": original name, "webp": {"300": name, ...}, ...}
+    Widths larger than the original are skipped.
+    """
+    storage = field_file.storage
+    if old_variants:
+        delete_derivatives(storage, old_variants)
+
+    with storage.open(field_file.name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    variants = {"source": field_file.name}
+    for fmt in FORMATS:
+        variants[fmt] = {}
+        for width in DERIVATIVE_WIDTHS:
+            if width >= image.width:
+                break
+            name = storage.save(
+                derivative_name(field_file.name, width, fmt),
+                _encode(image, width, fmt),
+            )
+            variants[fmt][str(width)] = name
+    variants["width"] = image.width
+    return variants
+
+
+def needs_derivatives(instance, image_field):
+    """Whether the image was replaced or removed since derivatives were made"""
+    field_file = getattr(instance, image_field)
+    variants = getattr(instance, VARIANT_FIELDS[image_field]) or {}
+    return (field_file.name or None) != variants.get("source")
+
+
+def lacks_formats(variants):
+    """Whether derivatives were made before a format became supported"""
+    return bool(variants) and any(fmt not in variants for fmt in FORMATS)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from books.recommendations import update_related_books
+
+
+class Command(BaseCommand):
+    help = (
+        "Count the orders placed since the last run into the co-purchase "
+        "matrix and update the related books they affect"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Start over from the first order.",
+        )
+
+    def handle(self, *args, **options):
+        orders = update_related_books(rebuild=options["rebuild"])
+        self.stdout.write(self.style.SUCCESS(f"Counted {orders} new orders."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from books.exports import BOOK_COLUMNS, EXPORT_FORMATS, book_records, export_lines
+
+
+class Command(BaseCommand):
+    help = "Export the catalog as CSV or JSON lines, streaming"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=list(EXPORT_FORMATS), default="csv", help="Default csv."
+        )
+        parser.add_argument(
+            "--output", help="The file to write, standard output by default."
+        )
+
+    def handle(self, *args, **options):
+        lines = export_lines(book_records(), BOOK_COLUMNS, options["format"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from books.images import FORMATS, VARIANT_FIELDS, lacks_formats
+from books.models import Book, BookContributor
+from books.tasks import generate_image_variants
+from jobs.queue import enqueue
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue the resized copies of the book covers and contributor photos "
+        "uploaded before they were generated, or before a format was supported"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Queue every image, even those with up to date copies.",
+        )
+
+    def handle(self, *args, **options):
+        queued = 0
+        for model, image_field in ((Book, "image"), (BookContributor, "photo")):
+            rows = model.objects.values_list(
+                "pk", image_field, VARIANT_FIELDS[image_field]
+            )
+            for pk, name, variants in rows.iterator():
+                variants = variants or {}
+                if (
+                    (options["all"] and name)
+                    or (name or None) != variants.get("source")
+                    or lacks_formats(variants)
+                ):
+                    enqueue(generate_image_variants, model._meta.label, pk, image_field)
+                    queued += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Queued {queued} images for {', '.join(FORMATS)} copies."
+            )
+        )
@@ -0,0 +1,363 @@
+"""
+Import books from a CSV or JSON lines supplier feed.
+
+The file is read as a stream and handled in batches, so memory use does
+not depend on its size. For every batch, publishers and contributors
+are looked up by slug and the missing ones created in bulk, books are
+matched by SKU (or by slug when the row has no SKU) and updated or
+created in bulk, and their categories, authors and illustrators are
+replaced with bulk through-table writes. Search documents and catalog
+cards are rebuilt once per batch.
+
+Columns, all but the first five optional:
+
+    title, price, pages, cover_type, illustration_type, sku, slug,
+    language, description, dimensions, weight, stock_quantity,
+    available, image_url, publisher, authors, illustrators, categories
+
+In CSV files, authors, illustrators and categories are separated by
+semicolons, in JSON lines they may also be lists. Categories are given
+by id or by name. A relation column that is absent leaves the existing
+relations of updated books as they are. Rows with neither a SKU nor a
+slug to match on are skipped, so that importing a feed again never
+duplicates books.
+"""
+
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+
+from books import book_index
+from books.models import Book, BookContributor, Category, Publisher
+from books.page_cache import bump_catalog_version
+from books.signals import refresh_books
+from books.slugs import allocate_slugs, base_slug
+
+REQUIRED_COLUMNS = ("title", "price", "pages", "cover_type", "illustration_type")
+RELATION_COLUMNS = {
+    "authors": "author",
+    "illustrators": "illustrator",
+}
+TRUE_VALUES = {"1", "true", "yes", "y"}
+# The largest value of a PositiveIntegerField on every database
+MAX_COUNT = 2147483647
+
+
+def read_rows(path, file_format):
+    """Yield the rows of a feed file as dicts"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if file_format == "csv":
+            for row in csv.DictReader(f):
+                yield row
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def split_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).split(";") if item.strip()]
+
+
+def clean_text(value):
+    return "" if value is None else str(value).strip()
+
+
+def parse_decimal(value, field_name):
+    """A feed number as a value that fits a decimal field of Book"""
+    field = Book._meta.get_field(field_name)
+    try:
+        number = Decimal(clean_text(value))
+    except InvalidOperation:
+        raise ValueError(f"invalid {field_name}")
+    if not number.is_finite():
+        raise ValueError(f"invalid {field_name}")
+    number = number.quantize(Decimal(1).scaleb(-field.decimal_places))
+    if not 0 < number < Decimal(10) ** (field.max_digits - field.decimal_places):
+        raise ValueError(f"invalid {field_name}")
+    return number
+
+
+def parse_count(value, field_name):
+    """A feed number as a value that fits a positive integer field"""
+    try:
+        number = int(clean_text(value))
+    except ValueError:
+        raise ValueError(f"invalid {field_name}")
+    if not 0 <= number <= MAX_COUNT:
+        raise ValueError(f"invalid {field_name}")
+    return number
+
+
+def parse_row(row, categories):
+    """
+    The book fields and relations of a feed row:
+    (fields, match key, publisher name, {relation: names or ids}).
+    Raises ValueError for invalid rows.
+    """
+    if not isinstance(row, dict):
+        raise ValueError("not an object")
+    for column in REQUIRED_COLUMNS:
+        if not clean_text(row.get(column)):
+            raise ValueError(f"missing {column}")
+
+    fields = {
+        "title": clean_text(row["title"])[:250],
+        "price": parse_decimal(row["price"], "price"),
+        "pages": parse_count(row["pages"], "pages"),
+    }
+    if clean_text(row.get("weight")):
+        fields["weight"] = parse_decimal(row["weight"], "weight")
+    if clean_text(row.get("stock_quantity")):
+        fields["stock_quantity"] = parse_count(row["stock_quantity"], "stock_quantity")
+
+    for column, choices in (
+        ("cover_type", Book.COVER_CHOICES),
+        ("illustration_type", Book.ILLUSTRATION_CHOICES),
+        ("language", Book.LANGUAGE_CHOICES),
+    ):
+        value = clean_text(row.get(column))
+        if value:
+            if value not in dict(choices):
+                raise ValueError(f"invalid {column} {value!r}")
+            fields[column] = value
+
+    for column in ("sku", "description", "dimensions", "image_url"):
+        if column in row:
+            fields[column] = clean_text(row[column]) or (
+                None if column in ("sku", "image_url") else ""
+            )
+            max_length = Book._meta.get_field(column).max_length
+            if max_length and len(fields[column] or "") > max_length:
+                raise ValueError(f"{column} longer than {max_length} characters")
+    if clean_text(row.get("available")):
+        fields["available"] = clean_text(row["available"]).lower() in TRUE_VALUES
+
+    slug = clean_text(row.get("slug"))
+    if fields.get("sku"):
+        key = ("sku", fields["sku"])
+    elif slug:
+        if len(slug) > Book._meta.get_field("slug").max_length:
+            raise ValueError(f"invalid slug {slug!r}")
+        key = ("slug", slug)
+        fields["slug"] = slug
+    else:
+        raise ValueError("no sku or slug to match the book on")
+
+    relations = {}
+    for column in RELATION_COLUMNS:
+        if column in row:
+            relations[column] = split_list(row[column])
+    if "categories" in row:
+        category_ids = []
+        for value in split_list(row["categories"]):
+            category_id = categories.get(value)
+            if category_id is None:
+                raise ValueError(f"unknown category {value!r}")
+            category_ids.append(category_id)
+        relations["categories"] = category_ids
+
+    publisher = clean_text(row["publisher"]) if "publisher" in row else None
+    return fields, key, publisher, relations
+
+
+def upsert_by_slug(model, names, defaults=None):
+    """
+    {name: pk} of the model rows with the slugs of the names, creating
+    the missing ones in bulk
+    """
+    names = {name: base_slug(model, name) for name in names}
+    names = {name: slug for name, slug in names.items() if slug}
+    # Names differing only in case or punctuation share a row
+    slugs = {slug: name for name, slug in names.items()}
+    existing = dict(model.objects.filter(slug__in=slugs).values_list("slug", "pk"))
+    missing = [
+        model(name=name, slug=slug, **(defaults or {}).get(name, {}))
+        for slug, name in slugs.items()
+        if slug not in existing
+    ]
+    if missing:
+        model.objects.bulk_create(missing, ignore_conflicts=True)
+        existing = dict(
+            model.objects.filter(slug__in=slugs).values_list("slug", "pk")
+        )
+    return {name: existing[slug] for name, slug in names.items() if slug in existing}
+
+
+class Command(BaseCommand):
+    help = "Import books from a CSV or JSON lines feed, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The feed file.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="The feed format, guessed from the file extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows written per transaction (default 1000).",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        file_format = options["format"] or (
+            "csv" if path.lower().endswith(".csv") else "jsonl"
+        )
+        batch_size = options["batch_size"]
+
+        # Categories are few, look them up by id or name in memory
+        self.categories = {}
+        for pk, name in Category.objects.values_list("pk", "name"):
+            self.categories[str(pk)] = pk
+            self.categories.setdefault(name, pk)
+
+        self.totals = {"created": 0, "updated": 0, "skipped": 0}
+        started = time.monotonic()
+        rows = enumerate(read_rows(path, file_format), start=1)
+        try:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch)
+                done = batch[-1][0]
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{done} rows, {done / elapsed:.0f} rows/s "
+                    f"({self.totals['created']} created, "
+                    f"{self.totals['updated']} updated, "
+                    f"{self.totals['skipped']} skipped)"
+                )
+        except (csv.Error, json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+        finally:
+            # Bulk writes send no signals: make this process rebuild its
+            # filter index and every cached page stale
+            book_index.drop_index()
+            bump_catalog_version()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {path} in {time.monotonic() - started:.1f}s: "
+                f"{self.totals['created']} created, "
+                f"{self.totals['updated']} updated, "
+                f"{self.totals['skipped']} skipped."
+            )
+        )
+
+    def import_batch(self, batch):
+        parsed = {}
+        for line, row in batch:
+            try:
+                fields, key, publisher, relations = parse_row(row, self.categories)
+            except ValueError as e:
+                self.totals["skipped"] += 1
+                self.stderr.write(f"Row {line}: {e}")
+                continue
+            # A book repeated within the batch: the last row wins
+            parsed[key] = (fields, publisher, relations)
+        rows = list(parsed.items())
+        if not rows:
+            return
+
+        with transaction.atomic():
+            publishers = upsert_by_slug(
+                Publisher,
+                {publisher for key, (_, publisher, _) in rows if publisher},
+            )
+            contributors = {}
+            for column, role in RELATION_COLUMNS.items():
+                names = {
+                    name
+                    for key, (_, _, relations) in rows
+                    for name in relations.get(column, ())
+                }
+                contributors[column] = upsert_by_slug(
+                    BookContributor, names, {name: {"role": role} for name in names}
+                )
+
+            books = self.save_books(rows, publishers)
+            self.save_relations(books, rows, contributors)
+            refresh_books(Book.objects.filter(pk__in=[book.pk for book in books]))
+
+    def save_books(self, rows, publishers):
+        """Update the matched books and create the others, in row order"""
+        skus = [value for (kind, value), _ in rows if kind == "sku"]
+        slugs = [value for (kind, value), _ in rows if kind == "slug"]
+        existing = {}
+        for book in Book.objects.filter(Q(sku__in=skus) | Q(slug__in=slugs)):
+            existing[("sku", book.sku)] = book
+            existing[("slug", book.slug)] = book
+
+        books = []
+        created = []
+        updated_fields = set()
+        for key, (fields, publisher, relations) in rows:
+            book = existing.get(key)
+            if book is None:
+                book = Book()
+                created.append(book)
+            else:
+                updated_fields.update(fields)
+                if publisher is not None:
+                    updated_fields.add("publisher")
+            for field, value in fields.items():
+                setattr(book, field, value)
+            if publisher is not None:
+                book.publisher_id = publishers.get(publisher)
+            books.append(book)
+
+        needs_slug = [book for book in created if not book.slug]
+        for book, slug in zip(
+            needs_slug, allocate_slugs(Book, [book.title for book in needs_slug])
+        ):
+            book.slug = slug
+        Book.objects.bulk_create(created)
+
+        created_ids = {id(book) for book in created}
+        updated = [book for book in books if id(book) not in created_ids]
+        updated_fields.discard("slug")
+        if updated and updated_fields:
+            Book.objects.bulk_update(updated, sorted(updated_fields))
+
+        self.totals["created"] += len(created)
+        self.totals["updated"] += len(updated)
+        return books
+
+    def save_relations(self, books, rows, contributors):
+        """Replace the relations given in the rows with bulk writes"""
+        for column in ("categories", *RELATION_COLUMNS):
+            through = getattr(Book, column).through
+            target = "category_id" if column == "categories" else "bookcontributor_id"
+            replaced = []
+            links = []
+            for book, (key, (fields, publisher, relations)) in zip(books, rows):
+                if column not in relations:
+                    continue
+                replaced.append(book.pk)
+                for value in relations[column]:
+                    if column == "categories":
+                        target_id = value
+                    else:
+                        target_id = contributors[column].get(value)
+                    if target_id is not None:
+                        links.append(through(book_id=book.pk, **{target: target_id}))
+            if replaced:
+                through.objects.filter(book_id__in=replaced).delete()
+                through.objects.bulk_create(links, ignore_conflicts=True)
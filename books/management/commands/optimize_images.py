@@ -0,0 +1,266 @@
+"""
+Re-encode the PNG and JPEG images in static/ and media/ as WebP (and
+AVIF when Pillow supports it), next to the originals.
+
+Every source directory keeps a manifest of the files it has processed,
+keyed by name, with the SHA-256 of their content and the outputs written.
+A file whose size and modification time match its manifest entry, and
+whose outputs are all still there, is skipped without being read, and
+one whose content hash matches is skipped without being re-encoded, so
+a run with nothing new to do only lists the directories. Encoding
+happens in a process pool.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageOps
+
+from books.images import supports_format
+
+MANIFEST_NAME = ".optimize_images.json"
+SOURCE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+DEFAULT_QUALITY = {"webp": 85, "avif": 60}
+# Resized copies made by books.images, already optimized
+DERIVATIVE_MARKER = "__w"
+
+
+def get_storage(source):
+    """The storage of a source: a static directory path or "media" """
+    if source == "media":
+        return storages["default"]
+    return FileSystemStorage(location=source)
+
+
+def walk(storage, path=""):
+    """Yield the names of all files below a storage directory"""
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield f"{path}/{name}" if path else name
+    for directory in directories:
+        yield from walk(storage, f"{path}/{directory}" if path else directory)
+
+
+def _stat(storage, name):
+    try:
+        modified = storage.get_modified_time(name).timestamp()
+    except NotImplementedError:
+        modified = None
+    return storage.size(name), modified
+
+
+def _save(storage, name, content):
+    # Media storage does not overwrite, it would save under a new name
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, content)
+
+
+def optimize(source, name, formats, entry):
+    """
+    Process one image in a worker process. Returns a manifest entry and
+    the number of bytes of the original and of its outputs, or None
+    for the outputs when the image was unchanged.
+    """
+    storage = get_storage(source)
+    if entry:
+        qualities = {fmt: out["quality"] for fmt, out in entry["outputs"].items()}
+        if qualities != formats:
+            # Encoded with other settings, start over
+            entry = None
+
+    size, modified = _stat(storage, name)
+    if entry and entry["size"] == size and entry["modified"] == modified:
+        return entry, size, None
+
+    with storage.open(name) as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    if entry and entry["hash"] == digest:
+        return dict(entry, size=size, modified=modified), size, None
+
+    image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    outputs = {}
+    output_bytes = {}
+    root = os.path.splitext(name)[0]
+    for fmt, quality in formats.items():
+        buffer = BytesIO()
+        image.save(buffer, fmt.upper(), quality=quality, method=6)
+        outputs[fmt] = {
+            "name": _save(storage, f"{root}.{fmt}", ContentFile(buffer.getvalue())),
+            "quality": quality,
+        }
+        output_bytes[fmt] = buffer.tell()
+
+    entry = {"hash": digest, "size": size, "modified": modified, "outputs": outputs}
+    return entry, size, output_bytes
+
+
+def parse_format(value):
+    """Parse a --format value like "webp" or "webp:80" """
+    fmt, _, quality = value.lower().partition(":")
+    if fmt not in DEFAULT_QUALITY:
+        raise CommandError(f"Unsupported format: {fmt}")
+    if not supports_format(fmt):
+        raise CommandError(f"This Pillow build cannot encode {fmt}")
+    try:
+        quality = int(quality) if quality else DEFAULT_QUALITY[fmt]
+    except ValueError:
+        raise CommandError(f"Invalid quality: {value}")
+    if not 1 <= quality <= 100:
+        raise CommandError(f"Invalid quality: {value}")
+    return fmt, quality
+
+
+def format_size(size):
+    return f"{size / 1024:.1f} KiB"
+
+
+class Command(BaseCommand):
+    help = "Re-encode changed static and media images as WebP/AVIF"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format",
+            action="append",
+            dest="formats",
+            metavar="FORMAT[:QUALITY]",
+            help=(
+                "Output format and quality, may be repeated. "
+                "Default: webp:85, and avif:60 when supported."
+            ),
+        )
+        parser.add_argument(
+            "--skip-static", action="store_true", help="Leave static/ alone."
+        )
+        parser.add_argument(
+            "--skip-media", action="store_true", help="Leave media/ alone."
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Number of worker processes, one per CPU by default.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-encode every image, ignoring the manifests.",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        if options["formats"]:
+            formats = dict(parse_format(value) for value in options["formats"])
+        else:
+            formats = {
+                fmt: quality
+                for fmt, quality in DEFAULT_QUALITY.items()
+                if supports_format(fmt)
+            }
+
+        sources = []
+        if not options["skip_static"]:
+            sources.extend(str(path) for path in settings.STATICFILES_DIRS)
+        if not options["skip_media"]:
+            sources.append("media")
+
+        self.totals = {"optimized": 0, "unchanged": 0, "failed": 0}
+        self.bytes_before = 0
+        self.bytes_after = {fmt: 0 for fmt in formats}
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            for source in sources:
+                self.optimize_source(pool, source, formats, options["force"])
+
+        self.stdout.write(
+            f"{self.totals['optimized']} optimized, "
+            f"{self.totals['unchanged']} unchanged, "
+            f"{self.totals['failed']} failed."
+        )
+        for fmt, after in self.bytes_after.items():
+            if self.bytes_before:
+                saved = self.bytes_before - after
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"{fmt}: {format_size(self.bytes_before)} -> "
+                        f"{format_size(after)}, saved {format_size(saved)} "
+                        f"({saved / self.bytes_before:.0%})"
+                    )
+                )
+
+    def optimize_source(self, pool, source, formats, force):
+        storage = get_storage(source)
+        if source != "media" and not os.path.isdir(source):
+            return
+
+        manifest = {}
+        if storage.exists(MANIFEST_NAME):
+            with storage.open(MANIFEST_NAME) as f:
+                manifest = json.load(f)
+
+        files = set(walk(storage))
+        names = [
+            name
+            for name in files
+            if name.lower().endswith(SOURCE_EXTENSIONS)
+            and DERIVATIVE_MARKER not in os.path.basename(name)
+        ]
+
+        def previous_entry(name):
+            entry = manifest.get(name)
+            if force or not entry:
+                return None
+            # An output deleted since makes the image be encoded again
+            if any(out["name"] not in files for out in entry["outputs"].values()):
+                return None
+            return entry
+
+        futures = {
+            pool.submit(optimize, source, name, formats, previous_entry(name)): name
+            for name in names
+        }
+
+        # Images that fail this time keep their entries, those deleted
+        # since the last run lose them
+        new_manifest = {name: manifest[name] for name in names if name in manifest}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                entry, size, output_bytes = future.result()
+            except Exception as e:
+                self.totals["failed"] += 1
+                self.stderr.write(f"{name}: {e}")
+                continue
+
+            new_manifest[name] = entry
+            if output_bytes is None:
+                self.totals["unchanged"] += 1
+                continue
+
+            self.totals["optimized"] += 1
+            self.bytes_before += size
+            for fmt, after in output_bytes.items():
+                self.bytes_after[fmt] += after
+            if self.verbosity >= 2:
+                outputs = ", ".join(
+                    f"{fmt} {format_size(after)}" for fmt, after in output_bytes.items()
+                )
+                self.stdout.write(f"{name}: {format_size(size)} -> {outputs}")
+
+        if new_manifest != manifest:
+            _save(
+                storage,
+                MANIFEST_NAME,
+                ContentFile(json.dumps(new_manifest, indent=2, sort_keys=True)),
+            )
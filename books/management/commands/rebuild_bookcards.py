@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from books.cards import save_book_cards
+from books.models import Book, BookCard
+
+
+class Command(BaseCommand):
+    help = "Rebuild the catalog card rows of all books"
+
+    def handle(self, *args, **options):
+        books = Book.objects.all()
+        save_book_cards(books)
+        deleted, _ = BookCard.objects.exclude(pk__in=books.values("pk")).delete()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {books.count()} book cards, removed {deleted} stale ones."
+            )
+        )
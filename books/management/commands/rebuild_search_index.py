@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from books.fuzzy import index_names
+from books.models import Book
+from books.search import index_books, is_available
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search documents of all books"
+
+    def handle(self, *args, **options):
+        index_names(Book.objects.all())
+        if not is_available():
+            self.stderr.write("This database has no full-text search index.")
+            return
+
+        index_books(Book.objects.all())
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {Book.objects.count()} books.")
+        )
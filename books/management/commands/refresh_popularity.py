@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from books.popularity import refresh_popularity
+
+
+class Command(BaseCommand):
+    help = "Recompute the bestselling and popularity sort keys from recent orders"
+
+    def handle(self, *args, **options):
+        sold = refresh_popularity()
+        self.stdout.write(self.style.SUCCESS(f"Updated the scores of {sold} books."))
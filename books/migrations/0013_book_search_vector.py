@@ -0,0 +1,123 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:40
+
+import re
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+# A frozen copy of books.search as of this migration
+
+SEARCH_CONFIG = "english"
+FTS_TABLE = "books_book_fts"
+BATCH_SIZE = 500
+
+WORD_RE = re.compile(r"\w+")
+CYRILLIC_RE = re.compile(r"[а-яіїєґ]")
+UKRAINIAN_ENDINGS = sorted(
+    (
+        "ість ості ого ому ими іми ами ями ові еві єві ють ять ать уть ити "
+        "ати яти ій ий ої ою ею єю их іх им ім ам ям ах ях ів їв ом ем єм "
+        "ти ть ла ло ли ся сь ує ає а я у ю о е є и і ї ь й"
+    ).split(),
+    key=len,
+    reverse=True,
+)
+MIN_STEM_LENGTH = 3
+
+
+def stem_ukrainian(word):
+    for ending in UKRAINIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[: -len(ending)]
+    return word
+
+
+def prepare_text(text):
+    words = WORD_RE.findall((text or "").lower())
+    return " ".join(
+        stem_ukrainian(word) if CYRILLIC_RE.search(word) else word
+        for word in words
+    )
+
+
+def build_search_index(apps, schema_editor):
+    """Create the full-text index and index the existing books"""
+    Book = apps.get_model("books", "Book")
+    conn = schema_editor.connection
+    books = (
+        Book.objects.using(conn.alias)
+        .select_related("publisher")
+        .prefetch_related("authors")
+    )
+    documents = [
+        (
+            book,
+            prepare_text(book.title),
+            prepare_text(" ".join(author.name for author in book.authors.all())),
+            prepare_text(book.publisher.name if book.publisher else ""),
+            prepare_text(book.description),
+        )
+        for book in books.iterator(chunk_size=BATCH_SIZE)
+    ]
+
+    if conn.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS books_book_search_vector_gin "
+            "ON books_book USING GIN (search_vector)"
+        )
+        for book, title, authors, publisher, description in documents:
+            book.search_vector = (
+                SearchVector(Value(title), config=SEARCH_CONFIG, weight="A")
+                + SearchVector(Value(authors), config=SEARCH_CONFIG, weight="B")
+                + SearchVector(Value(publisher), config=SEARCH_CONFIG, weight="C")
+                + SearchVector(Value(description), config=SEARCH_CONFIG, weight="D")
+            )
+        Book.objects.using(conn.alias).bulk_update(
+            [document[0] for document in documents],
+            ["search_vector"],
+            batch_size=BATCH_SIZE,
+        )
+
+    elif conn.vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                "USING fts5(title, authors, publisher, description, "
+                "tokenize='porter unicode61')"
+            )
+        except Exception:
+            # SQLite built without FTS5, search falls back to substrings
+            return
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} "
+                "(rowid, title, authors, publisher, description) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                [(document[0].pk, *document[1:]) for document in documents],
+            )
+
+
+def remove_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS books_book_search_vector_gin")
+    elif conn.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_create_sample_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(build_search_index, remove_search_index),
+    ]
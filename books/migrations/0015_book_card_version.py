@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0014_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='card_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
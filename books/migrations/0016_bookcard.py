@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+# A frozen copy of books.cards.BOOK_CARD_FIELDS as of this migration
+BOOK_CARD_FIELDS = (
+    "slug",
+    "title",
+    "price",
+    "image",
+    "image_variants",
+    "language",
+    "cover_type",
+    "illustration_type",
+    "available",
+    "card_version",
+)
+BATCH_SIZE = 500
+
+
+def build_book_cards(apps, schema_editor):
+    """Write the card rows of the existing books"""
+    Book = apps.get_model("books", "Book")
+    BookCard = apps.get_model("books", "BookCard")
+    books = (
+        Book.objects.using(schema_editor.connection.alias)
+        .order_by("pk")
+        .prefetch_related("authors", "categories")
+    )
+    cards = [
+        BookCard(
+            id=book.pk,
+            author_names=", ".join(author.name for author in book.authors.all()),
+            category_ids=sorted(category.pk for category in book.categories.all()),
+            **{field: getattr(book, field) for field in BOOK_CARD_FIELDS},
+        )
+        for book in books.iterator(chunk_size=BATCH_SIZE)
+    ]
+    BookCard.objects.using(schema_editor.connection.alias).bulk_create(
+        cards, batch_size=BATCH_SIZE
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0015_book_card_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookCard',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('slug', models.SlugField()),
+                ('title', models.CharField(max_length=250)),
+                ('author_names', models.TextField(blank=True)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='')),
+                ('image_variants', models.JSONField(blank=True, default=dict)),
+                ('language', models.CharField(max_length=30)),
+                ('cover_type', models.CharField(max_length=10)),
+                ('illustration_type', models.CharField(max_length=10)),
+                ('category_ids', models.JSONField(blank=True, default=list)),
+                ('available', models.BooleanField(default=True)),
+                ('card_version', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['price', 'id'], name='books_card_price_idx'), models.Index(fields=['language'], name='books_card_language_idx')],
+            },
+        ),
+        migrations.RunPython(build_book_cards, migrations.RunPython.noop),
+    ]
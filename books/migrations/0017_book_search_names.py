@@ -0,0 +1,86 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:55
+
+import re
+
+from django.db import migrations, models
+
+# A frozen copy of books.fuzzy as of this migration
+
+BATCH_SIZE = 500
+
+TRANSLITERATION = str.maketrans(
+    {
+        "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d",
+        "е": "e", "є": "ie", "ж": "zh", "з": "z", "и": "y", "і": "i",
+        "ї": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n",
+        "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+        "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh",
+        "щ": "shch", "ь": "", "ю": "iu", "я": "ia", "ы": "y", "э": "e",
+        "ё": "io", "ъ": "", "'": "", "’": "", "ʼ": "",
+    }
+)  # fmt: skip
+
+LATIN_FOLDS = (
+    ("shch", "sch"),
+    ("kh", "h"),
+    ("g", "h"),
+    ("y", "i"),
+    ("j", "i"),
+    ("w", "v"),
+    ("x", "ks"),
+    ("q", "k"),
+)
+
+NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def fold(text):
+    text = (text or "").lower().translate(TRANSLITERATION)
+    text = NON_WORD_RE.sub(" ", text)
+    for old, new in LATIN_FOLDS:
+        text = text.replace(old, new)
+    return " ".join(text.split())
+
+
+def build_fuzzy_index(apps, schema_editor):
+    """Fill in the search names and create their trigram index"""
+    Book = apps.get_model("books", "Book")
+    books = Book.objects.using(schema_editor.connection.alias).prefetch_related(
+        "authors"
+    )
+    batch = []
+    for book in books.iterator(chunk_size=BATCH_SIZE):
+        names = [book.title] + [author.name for author in book.authors.all()]
+        book.search_names = fold(" ".join(names))
+        batch.append(book)
+    Book.objects.using(schema_editor.connection.alias).bulk_update(
+        batch, ["search_names"], batch_size=BATCH_SIZE
+    )
+
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS books_book_search_names_trgm "
+            "ON books_book USING GIN (search_names gin_trgm_ops)"
+        )
+
+
+def remove_fuzzy_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS books_book_search_names_trgm")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0016_bookcard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_names',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(build_fuzzy_index, remove_fuzzy_index),
+    ]
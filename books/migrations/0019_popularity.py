@@ -0,0 +1,41 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0018_related_books'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='popularity',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='sales_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bookcard',
+            name='popularity',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bookcard',
+            name='sales_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='bookcard',
+            index=models.Index(fields=['sales_count', 'id'], name='books_card_sales_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bookcard',
+            index=models.Index(fields=['popularity', 'id'], name='books_card_popularity_idx'),
+        ),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import DatabaseError, models, transaction
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
-from slugify import slugify
 from multiselectfield import MultiSelectField
 
+from .slugs import save_with_slug
+
 # Create your models here.
 
 
@@ -71,11 +73,11 @@ class BookContributor(models.Model):
     about = models.TextField(blank=True)
     photo_url = models.URLField(max_length=1024, null=True, blank=True)
     photo = models.ImageField(null=True, blank=True)
+    # Resized copies of the photo, see books.images
+    photo_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        save_with_slug(self, self.name, super().save, *args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -86,9 +88,7 @@ class Publisher(models.Model):
     slug = models.SlugField(unique=True, blank=True)
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        save_with_slug(self, self.name, super().save, *args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -152,20 +152,146 @@ class Book(models.Model):
     description = models.TextField(blank=True)
     image_url = models.URLField(max_length=1024, null=True, blank=True)
     image = models.ImageField(null=True, blank=True)
+    # Resized copies of the cover, see books.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Maintained by books.signals, see books.search
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Maintained by books.signals, see books.fuzzy
+    search_names = models.TextField(blank=True, editable=False)
+    # Maintained by books.signals, see books.cards
+    card_version = models.PositiveIntegerField(default=0, editable=False)
+    # Maintained by the refresh_popularity command, see books.popularity
+    sales_count = models.PositiveIntegerField(default=0, editable=False)
+    popularity = models.FloatField(default=0, editable=False)
+
+    # Only ever changed with update(), which a save() of an instance
+    # loaded earlier must not undo
+    MAINTAINED_FIELDS = (
+        "image_variants",
+        "search_vector",
+        "search_names",
+        "card_version",
+        "sales_count",
+        "popularity",
+    )
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            base_slug = slugify(self.title)
-            slug = base_slug
-            counter = 1
+        if (
+            self._state.adding
+            or kwargs.get("update_fields") is not None
+            or kwargs.get("force_insert")
+            or args
+        ):
+            return save_with_slug(self, self.title, super().save, *args, **kwargs)
+
+        deferred = self.get_deferred_fields()
+        kwargs["update_fields"] = [
+            field.name
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+            and field.name not in self.MAINTAINED_FIELDS
+            and field.attname not in deferred
+        ]
+        try:
+            # A savepoint, so that a failed update can fall back to an insert
+            # inside an enclosing transaction
+            with transaction.atomic():
+                return save_with_slug(self, self.title, super().save, **kwargs)
+        except DatabaseError:
+            if Book.objects.filter(pk=self.pk).exists():
+                raise
+        # The row was deleted since the book was loaded, insert it again
+        del kwargs["update_fields"]
+        return save_with_slug(self, self.title, super().save, **kwargs)
+
+    def __str__(self):
+        return self.title
 
-            # Check for existing slugs and add number suffix if needed
-            while Book.objects.filter(slug=slug).exclude(pk=self.pk).exists():
-                counter += 1
-                slug = f"{base_slug}-{counter}"
 
-            self.slug = slug
-        super().save(*args, **kwargs)
+class BookCard(models.Model):
+    """
+    Everything a catalog card shows, one row per book, so that browsing
+    the catalog reads a single table. Maintained by books.signals, see
+    books.cards.
+    """
+
+    # The id of the book
+    id = models.BigIntegerField(primary_key=True)
+    slug = models.SlugField()
+    title = models.CharField(max_length=250)
+    author_names = models.TextField(blank=True)
+    price = models.DecimalField(max_digits=6, decimal_places=2)
+    image = models.ImageField(null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
+    language = models.CharField(max_length=30)
+    cover_type = models.CharField(max_length=10)
+    illustration_type = models.CharField(max_length=10)
+    category_ids = models.JSONField(default=list, blank=True)
+    available = models.BooleanField(default=True)
+    card_version = models.PositiveIntegerField(default=0)
+    sales_count = models.PositiveIntegerField(default=0)
+    popularity = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            # The orderings of books.pagination
+            models.Index(fields=["price", "id"], name="books_card_price_idx"),
+            models.Index(fields=["sales_count", "id"], name="books_card_sales_idx"),
+            models.Index(
+                fields=["popularity", "id"], name="books_card_popularity_idx"
+            ),
+            models.Index(fields=["language"], name="books_card_language_idx"),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class CoPurchase(models.Model):
+    """
+    How many orders contained both books, stored in both directions.
+    Maintained by the build_related_books command, see
+    books.recommendations.
+    """
+
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    other = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "other"], name="books_copurchase_unique"
+            )
+        ]
+
+
+class RelatedBook(models.Model):
+    """
+    The books most often bought together with a book, best first, as
+    shown on its page. Derived from CoPurchase.
+    """
+
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="related_books"
+    )
+    related = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="related_to"
+    )
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["book", "rank"], name="books_relatedbook_unique_rank"
+            )
+        ]
+
+
+class CoPurchaseRun(models.Model):
+    """A run of build_related_books and the last order it counted"""
+
+    last_order_id = models.PositiveBigIntegerField()
+    orders_counted = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(auto_now_add=True)
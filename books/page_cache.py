@@ -0,0 +1,154 @@
+"""
+Full-page cache for the catalog.
+
+Pages are cached per path and normalized query string under the
+current catalog version, a timestamp that books.signals moves forward
+whenever a book, category, contributor or publisher changes, so a
+change makes every cached page stale at once. The version doubles as
+the Last-Modified time, and the ETag is a hash of the cached content,
+so browsers revalidating a page they already have get a 304.
+
+The version is only seen by every process when the cache is shared
+(Redis). With a per-process cache, outside DEBUG, a change made by one
+gunicorn worker or the job worker would not reach the others, so pages
+are then rendered every time and the in-process indexes keyed by the
+version are not kept either, see catalog_caches_enabled().
+
+Cached pages are rendered with request.header_deferred set, which
+makes them the same for every visitor: the header shows an anonymous
+visitor with an empty cart, no messages, and both the customer and the
+superuser controls. A script in base.html then fills in the visitor's
+own from home.views.header, including the CSRF token, which is stored
+as a placeholder. The pages can therefore be cached by a CDN too.
+"""
+
+import hashlib
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag, urlencode
+
+VERSION_KEY = "books:catalog_version"
+PAGE_TIMEOUT = 60 * 60
+# How long shared caches may serve a page before revalidating it
+SHARED_MAX_AGE = 60
+
+# Query parameters that do not change the page
+IGNORED_PARAMS = {"csrfmiddlewaretoken", "fbclid", "gclid"}
+IGNORED_PREFIXES = ("utm_",)
+
+# Also matches the escaped quotes of HTML inside a JSON response
+CSRF_INPUT_RE = re.compile(
+    rb'name=\\?"csrfmiddlewaretoken\\?" value=\\?"([^"\\]+)'
+)
+CSRF_PLACEHOLDER = b"__page_cache_csrf_token__"
+
+# Cache backends that each process keeps to itself
+PROCESS_LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def cache_is_shared():
+    return settings.CACHES["default"]["BACKEND"] not in PROCESS_LOCAL_CACHES
+
+
+def catalog_caches_enabled():
+    """
+    Whether pages and indexes may be kept for the catalog version,
+    which needs a cache every process sees. A development server runs
+    in one process.
+    """
+    return settings.DEBUG or cache_is_shared()
+
+
+def get_catalog_version():
+    """The time of the last catalog change, in seconds since the epoch"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = int(time.time())
+        # Another process may have set it in the meantime
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def bump_catalog_version():
+    """Make every cached page stale, returning the new version"""
+    version = max(int(time.time()), (cache.get(VERSION_KEY) or 0) + 1)
+    cache.set(VERSION_KEY, version, None)
+    return version
+
+
+def normalize_query(query_dict):
+    """The query parameters that affect the page, in a stable order"""
+    params = sorted(
+        (key, value)
+        for key, values in query_dict.lists()
+        if key not in IGNORED_PARAMS and not key.startswith(IGNORED_PREFIXES)
+        for value in values
+    )
+    return urlencode(params)
+
+
+def _cache_key(request, version):
+    url = f"{request.path}?{normalize_query(request.GET)}"
+    digest = hashlib.md5(url.encode()).hexdigest()
+    return f"books:page:{version}:{digest}"
+
+
+def _set_validators(response, etag, version):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(version)
+    patch_cache_control(response, public=True, max_age=0, s_maxage=SHARED_MAX_AGE)
+
+
+def cache_shared_page(view):
+    """Serve a view from the page cache, see the module docstring"""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or not catalog_caches_enabled():
+            return view(request, *args, **kwargs)
+
+        version = get_catalog_version()
+        key = _cache_key(request, version)
+        entry = cache.get(key)
+
+        if entry is None:
+            request.header_deferred = True
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            # Rendering the CSRF token asked for a cookie. It would make
+            # the page uncacheable, the header fragment sets it instead
+            request.META["CSRF_COOKIE_NEEDS_UPDATE"] = False
+
+            content = response.content
+            match = CSRF_INPUT_RE.search(content)
+            if match:
+                content = content.replace(match.group(1), CSRF_PLACEHOLDER)
+            entry = {
+                "content": content,
+                "content_type": response["Content-Type"],
+                "etag": quote_etag(hashlib.md5(content).hexdigest()),
+            }
+            cache.set(key, entry, PAGE_TIMEOUT)
+
+        response = get_conditional_response(
+            request, etag=entry["etag"], last_modified=version
+        )
+        if response is None:
+            response = HttpResponse(
+                entry["content"], content_type=entry["content_type"]
+            )
+        _set_validators(response, entry["etag"], version)
+        return response
+
+    return wrapper
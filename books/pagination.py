@@ -0,0 +1,127 @@
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.urls import reverse
+
+PAGE_SIZE = 24
+
+# Every ordering ends with a unique column so that the cursor identifies
+# exactly one position in the result set.
+SORT_ORDERINGS = {
+    "price_asc": ("price", "id"),
+    "price_desc": ("-price", "-id"),
+    # Precomputed by the refresh_popularity command, see books.popularity
+    "bestselling": ("-sales_count", "-id"),
+    "popular": ("-popularity", "-id"),
+    "relevance": ("-search_rank", "-id"),
+}
+DEFAULT_ORDERING = ("id",)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_ordering(sort_option):
+    return SORT_ORDERINGS.get(sort_option, DEFAULT_ORDERING)
+
+
+def encode_cursor(book, ordering):
+    """
+    Encode the sort key values of the last book on a page into
+    an opaque, url-safe cursor string.
+    """
+    values = [str(getattr(book, field.lstrip("-"))) for field in ordering]
+    payload = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def _sort_field(books, name):
+    """The model field or annotation a queryset is ordered by"""
+    try:
+        return books.model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return books.query.annotations[name].output_field
+
+
+def decode_cursor(cursor, books, ordering):
+    """
+    The sort key values of a cursor, converted to the types of the sort
+    columns of a queryset
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor(cursor)
+    try:
+        values = [
+            _sort_field(books, field.lstrip("-")).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except (ValidationError, TypeError, ValueError):
+        raise InvalidCursor(cursor)
+    # The sort columns are not nullable, and None is no query value
+    if None in values:
+        raise InvalidCursor(cursor)
+    return values
+
+
+def _after(ordering, values):
+    """
+    Build the keyset condition "row comes after the cursor" for a
+    multi-column ordering, e.g. for ("price", "id"):
+    price > p OR (price = p AND id > i)
+    """
+    condition = Q()
+    equal_prefix = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal_prefix & Q(**{f"{name}__{lookup}": value})
+        equal_prefix &= Q(**{name: value})
+    return condition
+
+
+def paginate_books(books, sort_option=None, cursor=None, page_size=PAGE_SIZE):
+    """
+    Return one page of books and the cursor for the next page,
+    or None when this is the last page.
+
+    Pages are selected with a keyset condition on the sort columns
+    instead of OFFSET, so every page costs the same regardless of
+    how deep into the catalog it is.
+    """
+    ordering = get_ordering(sort_option)
+    books = books.order_by(*ordering)
+
+    if cursor:
+        values = decode_cursor(cursor, books, ordering)
+        books = books.filter(_after(ordering, values))
+
+    # Fetch one extra row to find out whether there is a next page
+    page = list(books[: page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = encode_cursor(page[-1], ordering)
+
+    return page, next_cursor
+
+
+def get_next_page_url(request, next_cursor):
+    """
+    Build the url of the next page of cards, preserving the current
+    filters and the path of the page the cards are rendered into.
+    """
+    if not next_cursor:
+        return None
+    params = request.GET.copy()
+    params.setdefault("path", request.path)
+    params["cursor"] = next_cursor
+    return f"{reverse('more_books')}?{params.urlencode()}"
@@ -0,0 +1,74 @@
+"""
+Bestseller and popularity sort keys, precomputed from recent orders.
+
+refresh_popularity() reads the order lines of the last POPULARITY_WINDOW
+once and stores two numbers on every book and its BookCard:
+
+- sales_count, the copies sold in the last BESTSELLER_WINDOW, for the
+  "bestselling" sort
+- popularity, the copies sold in the whole window, each weighted by
+  half for every POPULARITY_HALF_LIFE since it was sold, for the
+  "popular" sort
+
+Both columns are indexed on BookCard, so these sorts cost the same as a
+price sort. The refresh_popularity command should run periodically,
+e.g. hourly.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from checkout.models import OrderLineItem
+from .models import Book, BookCard
+from .page_cache import bump_catalog_version
+
+BESTSELLER_WINDOW = timedelta(days=30)
+POPULARITY_WINDOW = timedelta(days=90)
+POPULARITY_HALF_LIFE = timedelta(days=14)
+BATCH_SIZE = 1000
+
+
+def compute_scores(now=None):
+    """{book id: (sales_count, popularity)} of the books sold recently"""
+    now = now or timezone.now()
+    sales = Counter()
+    popularity = Counter()
+    lines = OrderLineItem.objects.filter(
+        order__date__gte=now - POPULARITY_WINDOW, quantity__gt=0
+    ).values_list("book_id", "quantity", "order__date")
+    for book_id, quantity, date in lines.iterator(chunk_size=BATCH_SIZE):
+        age = now - date
+        if age <= BESTSELLER_WINDOW:
+            sales[book_id] += quantity
+        popularity[book_id] += quantity * 0.5 ** (age / POPULARITY_HALF_LIFE)
+    # Rounded so that the values survive a pagination cursor unchanged
+    return {
+        book_id: (sales[book_id], round(score, 6))
+        for book_id, score in popularity.items()
+    }
+
+
+def refresh_popularity(now=None):
+    """Store the current sort keys, returning the number of books sold"""
+    scores = compute_scores(now)
+    with transaction.atomic():
+        for model in (Book, BookCard):
+            model.objects.bulk_update(
+                [
+                    model(pk=book_id, sales_count=sales_count, popularity=popularity)
+                    for book_id, (sales_count, popularity) in scores.items()
+                ],
+                ["sales_count", "popularity"],
+                batch_size=BATCH_SIZE,
+            )
+            # Books no longer sold within the window
+            model.objects.exclude(pk__in=list(scores)).filter(
+                Q(sales_count__gt=0) | Q(popularity__gt=0)
+            ).update(sales_count=0, popularity=0)
+    # The sorted catalog pages change
+    bump_catalog_version()
+    return len(scores)
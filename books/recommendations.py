@@ -0,0 +1,130 @@
+"""
+"Customers also bought" recommendations from the order history.
+
+CoPurchase is a sparse book-by-book matrix of how many orders contained
+both books. update_related_books() adds the orders placed since its
+last run to it and then recomputes the top related books (RelatedBook)
+of just the books those orders touched, so each run costs in
+proportion to the new orders, not to the whole history.
+"""
+
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import permutations
+
+from django.db import transaction
+from django.db.models import F, Min, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from checkout.models import Order, OrderLineItem
+from .models import CoPurchase, CoPurchaseRun, RelatedBook
+from .page_cache import bump_catalog_version
+
+RELATED_LIMIT = 8
+BATCH_SIZE = 1000
+# Orders this recent may still be committing, a later run counts them
+SETTLE_TIME = timedelta(minutes=5)
+
+
+def count_pairs(line_items):
+    """
+    Count the ordered pairs of distinct books in the same order, from
+    (order id, book id) rows
+    """
+    orders = defaultdict(set)
+    for order_id, book_id in line_items:
+        orders[order_id].add(book_id)
+    pairs = Counter()
+    for book_ids in orders.values():
+        pairs.update(permutations(sorted(book_ids), 2))
+    return pairs, len(orders)
+
+
+def add_pairs(pairs):
+    """Add pair counts to CoPurchase, returning the books touched"""
+    books = {book_id for book_id, other_id in pairs}
+    existing = {
+        (row.book_id, row.other_id): row
+        for row in CoPurchase.objects.filter(book_id__in=books, other_id__in=books)
+    }
+    rows = []
+    for (book_id, other_id), count in pairs.items():
+        row = existing.get((book_id, other_id))
+        if row is None:
+            row = CoPurchase(book_id=book_id, other_id=other_id, orders=0)
+        row.orders += count
+        rows.append(row)
+    CoPurchase.objects.bulk_create(
+        rows,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=["book", "other"],
+        update_fields=["orders"],
+    )
+    return books
+
+
+def rank_related_books(book_ids):
+    """Recompute the RelatedBook rows of the given books from CoPurchase"""
+    book_ids = sorted(book_ids)
+    for start in range(0, len(book_ids), BATCH_SIZE):
+        batch = book_ids[start : start + BATCH_SIZE]
+        # The top pairs of every book of the batch in one query
+        top = (
+            CoPurchase.objects.filter(book_id__in=batch)
+            .annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=F("book_id"),
+                    order_by=(F("orders").desc(), F("other_id").asc()),
+                )
+            )
+            .filter(position__lte=RELATED_LIMIT)
+            .values_list("book_id", "other_id", "position")
+        )
+        related = [
+            RelatedBook(book_id=book_id, related_id=other_id, rank=position)
+            for book_id, other_id, position in top
+        ]
+        RelatedBook.objects.filter(book_id__in=batch).delete()
+        RelatedBook.objects.bulk_create(related)
+
+
+def update_related_books(rebuild=False):
+    """
+    Count the orders placed since the last run and update the related
+    books they affect. With rebuild, start over from the first order.
+    Returns the number of orders counted.
+    """
+    last_run = None if rebuild else CoPurchaseRun.objects.order_by("pk").last()
+    last_order_id = last_run.last_order_id if last_run else 0
+
+    # Stop before the first order that may still be committing, so that
+    # none is passed over
+    first_recent = Order.objects.filter(
+        pk__gt=last_order_id, date__gte=timezone.now() - SETTLE_TIME
+    ).aggregate(first=Min("pk"))["first"]
+    line_items = OrderLineItem.objects.filter(order_id__gt=last_order_id)
+    if first_recent is not None:
+        line_items = line_items.filter(order_id__lt=first_recent)
+    line_items = list(line_items.values_list("order_id", "book_id"))
+
+    with transaction.atomic():
+        if rebuild:
+            CoPurchase.objects.all().delete()
+            RelatedBook.objects.all().delete()
+
+        pairs, orders_counted = count_pairs(line_items)
+        if orders_counted:
+            last_order_id = max(order_id for order_id, book_id in line_items)
+        touched = add_pairs(pairs) if pairs else set()
+        rank_related_books(touched)
+        CoPurchaseRun.objects.create(
+            last_order_id=last_order_id, orders_counted=orders_counted
+        )
+
+    if touched:
+        # Book pages show the related books
+        bump_catalog_version()
+    return orders_counted
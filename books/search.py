@@ -0,0 +1,205 @@
+"""
+Full-text search over the book catalog.
+
+On PostgreSQL every book stores a weighted tsvector in
+Book.search_vector, backed by a GIN index. On SQLite the same
+documents go into the books_book_fts FTS5 table. Both are kept up to
+date by the signal handlers in books.signals.
+
+Neither database ships a Ukrainian stemmer, so Cyrillic words are
+stemmed here with a light suffix-stripping stemmer before they are
+indexed or searched for. Latin words are left to the database, which
+stems them as English.
+"""
+
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, connections
+from django.db.models import F, FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+SEARCH_CONFIG = "english"
+FTS_TABLE = "books_book_fts"
+BATCH_SIZE = 500
+
+# Weights of the title, authors, publisher and description, highest first
+FTS_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+WORD_RE = re.compile(r"\w+")
+CYRILLIC_RE = re.compile(r"[а-яіїєґ]")
+
+# Inflectional endings of Ukrainian nouns, adjectives and verbs,
+# longest first so that the longest matching ending is removed
+UKRAINIAN_ENDINGS = sorted(
+    (
+        "ість ості ого ому ими іми ами ями ові еві єві ють ять ать уть ити "
+        "ати яти ій ий ої ою ею єю их іх им ім ам ям ах ях ів їв ом ем єм "
+        "ти ть ла ло ли ся сь ує ає а я у ю о е є и і ї ь й"
+    ).split(),
+    key=len,
+    reverse=True,
+)
+MIN_STEM_LENGTH = 3
+
+
+def stem_ukrainian(word):
+    """Strip the inflectional ending from a lowercase Ukrainian word"""
+    for ending in UKRAINIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[: -len(ending)]
+    return word
+
+
+def prepare_text(text):
+    """
+    Lowercase and tokenize text, stemming the Ukrainian words.
+    The same preparation is applied to documents and to queries.
+    """
+    words = WORD_RE.findall((text or "").lower())
+    return " ".join(
+        stem_ukrainian(word) if CYRILLIC_RE.search(word) else word
+        for word in words
+    )
+
+
+def _documents(books):
+    """Yield (book, title, authors, publisher, description) for indexing"""
+    books = books.select_related("publisher").prefetch_related("authors")
+    for book in books.iterator(chunk_size=BATCH_SIZE):
+        yield (
+            book,
+            prepare_text(book.title),
+            prepare_text(" ".join(author.name for author in book.authors.all())),
+            prepare_text(book.publisher.name if book.publisher else ""),
+            prepare_text(book.description),
+        )
+
+
+# Database aliases known to have the FTS5 table, to avoid introspecting
+# the schema on every search
+_fts_tables = set()
+
+
+def _fts_table_exists(conn):
+    if conn.alias not in _fts_tables:
+        if FTS_TABLE not in conn.introspection.table_names():
+            return False
+        _fts_tables.add(conn.alias)
+    return True
+
+
+def create_search_index(schema_editor):
+    """Create the backend-specific search index"""
+    conn = schema_editor.connection
+    if conn.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS books_book_search_vector_gin "
+            "ON books_book USING GIN (search_vector)"
+        )
+    elif conn.vendor == "sqlite":
+        try:
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                "USING fts5(title, authors, publisher, description, "
+                "tokenize='porter unicode61')"
+            )
+        except Exception:
+            # SQLite built without FTS5, search falls back to substrings
+            pass
+
+
+def drop_search_index(schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS books_book_search_vector_gin")
+    elif conn.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def index_books(books):
+    """(Re)build the search documents of the given books"""
+    conn = connections[books.db]
+
+    if conn.vendor == "postgresql":
+        batch = []
+        for book, title, authors, publisher, description in _documents(books):
+            book.search_vector = (
+                SearchVector(Value(title), config=SEARCH_CONFIG, weight="A")
+                + SearchVector(Value(authors), config=SEARCH_CONFIG, weight="B")
+                + SearchVector(Value(publisher), config=SEARCH_CONFIG, weight="C")
+                + SearchVector(Value(description), config=SEARCH_CONFIG, weight="D")
+            )
+            batch.append(book)
+        books.model.objects.using(books.db).bulk_update(
+            batch, ["search_vector"], batch_size=BATCH_SIZE
+        )
+
+    elif conn.vendor == "sqlite" and _fts_table_exists(conn):
+        rows = [
+            (book.pk, title, authors, publisher, description)
+            for book, title, authors, publisher, description in _documents(books)
+        ]
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(row[0],) for row in rows],
+            )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} "
+                "(rowid, title, authors, publisher, description) "
+                "VALUES (%s, %s, %s, %s, %s)",
+                rows,
+            )
+
+
+def unindex_books(book_ids):
+    """Remove deleted books from the SQLite index"""
+    if connection.vendor == "sqlite" and _fts_table_exists(connection):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(book_id,) for book_id in book_ids],
+            )
+
+
+def is_available():
+    """Whether the current database has a full-text index to search"""
+    if connection.vendor == "postgresql":
+        return True
+    return connection.vendor == "sqlite" and _fts_table_exists(connection)
+
+
+def search(books, text):
+    """
+    Filter books to those matching every word of the search text and
+    annotate them with search_rank, higher meaning more relevant.
+    """
+    prepared = prepare_text(text)
+    if not prepared:
+        # No words to match, which FTS5 would reject as a syntax error
+        return books.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+    if connection.vendor == "postgresql":
+        query = SearchQuery(prepared, config=SEARCH_CONFIG)
+        # ts_rank returns a real, cast it so the value survives a round
+        # trip through a pagination cursor unchanged
+        return books.filter(search_vector=query).annotate(
+            search_rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+        )
+
+    # FTS5 treats bare words as operators or column names, so quote each
+    match = " AND ".join(f'"{word}"' for word in prepared.split())
+    weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
+    matching_ids = RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+    )
+    return books.filter(id__in=matching_ids).annotate(
+        search_rank=RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = books_book.id",
+            [match],
+            output_field=FloatField(),
+        )
+    )
@@ -0,0 +1,179 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from jobs.queue import enqueue
+from . import book_index
+from .cards import bump_card_versions, delete_book_cards, save_book_cards
+from .category_tree import CategoryTree
+from .fuzzy import index_names
+from .images import needs_derivatives
+from .models import Book, BookContributor, Category, Publisher
+from .page_cache import bump_catalog_version, get_catalog_version
+from .search import index_books, unindex_books
+from .tasks import generate_image_variants
+
+
+def refresh_books(books):
+    """Rebuild the search documents and catalog cards of changed books"""
+    index_books(books)
+    index_names(books)
+    bump_card_versions(books)
+    save_book_cards(books)
+
+
+@receiver(post_save, sender=Book)
+def index_book_on_save(sender, instance, raw=False, **kwargs):
+    """
+    Rebuild the search document and card of a saved book
+    """
+    if not raw:
+        refresh_books(Book.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Book)
+def unindex_book_on_delete(sender, instance, **kwargs):
+    """
+    Remove a deleted book from the search index and the catalog cards
+    """
+    unindex_books([instance.pk])
+    delete_book_cards([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def index_books_on_authors_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Rebuild the search documents and cards of books whose authors
+    changed, from either side of the relation
+    """
+    if action == "pre_clear" and reverse:
+        # post_clear from the contributor side does not report the books
+        instance._search_book_ids = list(
+            instance.authored_books.values_list("pk", flat=True)
+        )
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            book_ids = [instance.pk]
+        elif action == "post_clear":
+            book_ids = instance._search_book_ids
+        else:
+            book_ids = pk_set
+        refresh_books(Book.objects.filter(pk__in=book_ids))
+
+
+@receiver(post_save, sender=BookContributor)
+def index_books_on_contributor_save(sender, instance, raw=False, **kwargs):
+    """
+    Rebuild the search documents and cards of the books of a renamed author
+    """
+    if not raw:
+        refresh_books(Book.objects.filter(authors=instance))
+
+
+@receiver(post_save, sender=Publisher)
+def index_books_on_publisher_save(sender, instance, raw=False, **kwargs):
+    """
+    Rebuild the search documents and cards of the books of a renamed
+    publisher
+    """
+    if not raw:
+        refresh_books(Book.objects.filter(publisher=instance))
+
+
+@receiver(pre_delete, sender=BookContributor)
+def remember_contributor_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(
+        instance.authored_books.values_list("pk", flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Publisher)
+def remember_publisher_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.books.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=BookContributor)
+@receiver(post_delete, sender=Publisher)
+def index_books_on_related_delete(sender, instance, **kwargs):
+    """
+    Rebuild the search documents and cards of books that lost an author
+    or publisher
+    """
+    refresh_books(Book.objects.filter(pk__in=instance._search_book_ids))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """
+    Drop the cached navigation tree and filter index when any category
+    changes
+    """
+    CategoryTree.invalidate()
+    book_index.drop_index()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def mark_book_for_filter_index(sender, instance, raw=False, **kwargs):
+    """
+    Update the filter index entry of a saved or deleted book with the
+    next catalog version
+    """
+    book_index.mark_changed([instance.pk])
+
+
+@receiver(m2m_changed, sender=Book.categories.through)
+def refresh_books_on_categories_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """
+    Update the filter index entries and catalog card rows of books whose
+    categories changed, from either side of the relation
+    """
+    if action == "pre_clear" and reverse:
+        # post_clear from the category side does not report the books
+        instance._index_book_ids = list(instance.books.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            book_ids = [instance.pk]
+        elif action == "post_clear":
+            book_ids = instance._index_book_ids
+        else:
+            book_ids = pk_set
+        book_index.mark_changed(book_ids)
+        save_book_cards(Book.objects.filter(pk__in=book_ids))
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=BookContributor)
+def queue_image_variants(sender, instance, raw=False, **kwargs):
+    """
+    Queue the resizing of a newly uploaded, replaced or removed image
+    """
+    if raw:
+        return
+    image_field = "image" if sender is Book else "photo"
+    if needs_derivatives(instance, image_field):
+        enqueue(generate_image_variants, sender._meta.label, instance.pk, image_field)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=BookContributor)
+@receiver(post_delete, sender=BookContributor)
+@receiver(post_save, sender=Publisher)
+@receiver(post_delete, sender=Publisher)
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.categories.through)
+def invalidate_page_cache(sender, **kwargs):
+    """
+    Make the cached catalog pages stale when anything shown on them
+    changes, and bring this process's filter index up to date
+    """
+    m2m_action = kwargs.get("action")
+    if m2m_action and not m2m_action.startswith("post_"):
+        return
+    previous = get_catalog_version()
+    book_index.follow_version(previous, bump_catalog_version())
@@ -0,0 +1,96 @@
+"""
+Unique slugs for Book, BookContributor and Publisher.
+
+A slug is made from a name and, if that is taken, given the first free
+numeric suffix ("kobzar", "kobzar-2", "kobzar-3", ...). The slugs taken
+are read in one slug__startswith query per batch of names, however many
+suffixes a popular name already has. Slugs are cut at a word boundary
+to fit the slug field, and cut further to make room for a suffix. Two
+processes may still pick the same slug at once; save_with_slug() then
+lets the unique constraint fail and allocates again.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from slugify import slugify
+
+# Names whose taken slugs are read in one query
+BATCH_SIZE = 500
+SAVE_ATTEMPTS = 3
+# The longest suffix the taken slugs are looked up for, "-99999"
+SUFFIX_LENGTH = 6
+
+
+def base_slug(model, name):
+    """The slug of a name, cut to fit the model's slug field"""
+    max_length = model._meta.get_field("slug").max_length
+    return slugify(name, max_length=max_length, word_boundary=True)
+
+
+def _with_suffix(base, counter, max_length):
+    suffix = f"-{counter}"
+    return base[: max_length - len(suffix)].rstrip("-") + suffix
+
+
+def allocate_slugs(model, names, exclude_pk=None):
+    """Free slugs for new rows of a model, one per name, in name order"""
+    max_length = model._meta.get_field("slug").max_length
+    fallback = model._meta.model_name
+    bases = [base_slug(model, name) or fallback for name in names]
+
+    distinct = sorted(set(bases))
+    taken = set()
+    for start in range(0, len(distinct), BATCH_SIZE):
+        conflicts = Q()
+        for base in distinct[start : start + BATCH_SIZE]:
+            # Every candidate starts with this, suffixed or not
+            prefix = base[: max_length - SUFFIX_LENGTH].rstrip("-")
+            conflicts |= Q(slug__startswith=prefix)
+        rows = model._default_manager.filter(conflicts)
+        if exclude_pk is not None:
+            rows = rows.exclude(pk=exclude_pk)
+        taken.update(rows.values_list("slug", flat=True))
+
+    slugs = []
+    for base in bases:
+        slug = base
+        counter = 1
+        while slug in taken:
+            counter += 1
+            slug = _with_suffix(base, counter, max_length)
+        # Names repeated in the batch get suffixes of their own
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def allocate_slug(model, name, exclude_pk=None):
+    return allocate_slugs(model, [name], exclude_pk)[0]
+
+
+def save_with_slug(instance, name, save, *args, **kwargs):
+    """
+    Save a model instance with save(*args, **kwargs), first giving it
+    a free slug made from name if it has none. Retried with a new slug
+    when a concurrent save took the same one.
+    """
+    if instance.slug:
+        return save(*args, **kwargs)
+
+    model = type(instance)
+    for attempt in range(SAVE_ATTEMPTS):
+        instance.slug = allocate_slug(model, name, exclude_pk=instance.pk)
+        try:
+            # A savepoint, so that a failed insert does not break an
+            # enclosing transaction
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            taken = (
+                model._default_manager.filter(slug=instance.slug)
+                .exclude(pk=instance.pk)
+                .exists()
+            )
+            instance.slug = ""
+            if not taken or attempt == SAVE_ATTEMPTS - 1:
+                raise
@@ -0,0 +1,137 @@
+"""
+Typeahead suggestions for the search box.
+
+Each process keeps a sorted array of the book titles, author names and
+publisher names, entered once for every word they contain from that
+word to the end ("The Snow Queen" under "the snow queen", "snow queen"
+and "queen"). The suggestions for a prefix are found by bisection
+followed by a short forward scan, so typing never touches the
+database. Like books.book_index, the array is rebuilt when the catalog
+version (see books.page_cache) moves on.
+"""
+
+import re
+import threading
+from bisect import bisect_left
+
+from django.urls import reverse
+from django.utils.http import urlencode
+
+from .models import Book, BookContributor, Publisher
+from .page_cache import catalog_caches_enabled, get_catalog_version
+
+SUGGESTION_LIMIT = 8
+# How many matching entries to look at before picking the best ones
+SCAN_LIMIT = 200
+MAX_PREFIX_LENGTH = 100
+
+# Suggestion kinds, in the order they are listed
+KINDS = ("book", "author", "publisher")
+
+WORD_START_RE = re.compile(r"\b\w", re.UNICODE)
+
+_lock = threading.Lock()
+_index = None
+
+
+def normalize(text):
+    return " ".join(text.casefold().split())
+
+
+class SuggestionIndex:
+    def __init__(self, version, suggestions):
+        self.version = version
+        # (key, suggestion number), sorted by key
+        self.entries = []
+        # Suggestion number -> (kind, label, url)
+        self.suggestions = suggestions
+        # Suggestion number -> length of its normalized label
+        self.lengths = []
+        for number, (kind, label, url) in enumerate(suggestions):
+            text = normalize(label)
+            self.lengths.append(len(text))
+            for match in WORD_START_RE.finditer(text):
+                self.entries.append((text[match.start() :], number))
+        self.entries.sort()
+
+    @classmethod
+    def build(cls, version, containing=None):
+        """
+        The index of the whole catalog, or of the at most SCAN_LIMIT
+        names of each kind containing some text
+        """
+        books_url = reverse("books")
+
+        def names(queryset, field):
+            if containing is None:
+                return queryset
+            return queryset.filter(**{f"{field}__icontains": containing})[
+                :SCAN_LIMIT
+            ]
+
+        def search_url(name):
+            return f"{books_url}?{urlencode({'q': name})}"
+
+        suggestions = [
+            ("book", title, reverse("book_detail", args=[slug]))
+            for title, slug in names(
+                Book.objects.values_list("title", "slug"), "title"
+            )
+        ]
+        suggestions.extend(
+            ("author", name, search_url(name))
+            for name in names(
+                BookContributor.objects.filter(role="author")
+                .values_list("name", flat=True)
+                .distinct(),
+                "name",
+            )
+        )
+        suggestions.extend(
+            ("publisher", name, search_url(name))
+            for name in names(
+                Publisher.objects.values_list("name", flat=True).distinct(), "name"
+            )
+        )
+        return cls(version, suggestions)
+
+    def suggest(self, prefix, limit=SUGGESTION_LIMIT):
+        """
+        The suggestions with a word starting with prefix, those that
+        start with it first, then by kind and label
+        """
+        prefix = normalize(prefix)[:MAX_PREFIX_LENGTH]
+        if not prefix:
+            return []
+
+        found = {}
+        position = bisect_left(self.entries, (prefix,))
+        for key, number in self.entries[position : position + SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            kind, label, url = self.suggestions[number]
+            # The entry of the first word holds the whole label
+            starts_with = len(key) == self.lengths[number]
+            if number not in found or starts_with:
+                found[number] = (not starts_with, KINDS.index(kind), label.casefold())
+
+        numbers = sorted(found, key=found.__getitem__)[:limit]
+        return [self.suggestions[number] for number in numbers]
+
+
+def get_suggestions(prefix, limit=SUGGESTION_LIMIT):
+    """The (kind, label, url) suggestions for a search box prefix"""
+    global _index
+    version = get_catalog_version()
+    if not catalog_caches_enabled():
+        # The index cannot be kept (see books.page_cache), build one of
+        # the names the prefix can match
+        prefix = normalize(prefix)[:MAX_PREFIX_LENGTH]
+        if not prefix:
+            return []
+        return SuggestionIndex.build(version, prefix).suggest(prefix, limit)
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = SuggestionIndex.build(version)
+        index = _index
+    return index.suggest(prefix, limit)
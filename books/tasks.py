@@ -0,0 +1,39 @@
+from django.apps import apps
+from django.db.models import F
+
+from .cards import save_book_cards
+from .images import VARIANT_FIELDS, delete_derivatives, generate_derivatives
+from .models import Book
+from .page_cache import bump_catalog_version
+
+
+def generate_image_variants(model_label, pk, image_field):
+    """
+    Background job: (re)create the resized copies of an uploaded image
+    and record their names on the instance
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return
+
+    field_file = getattr(instance, image_field)
+    variants_field = VARIANT_FIELDS[image_field]
+    old_variants = getattr(instance, variants_field) or {}
+
+    if field_file:
+        variants = generate_derivatives(field_file, old_variants)
+    else:
+        delete_derivatives(field_file.storage, old_variants)
+        variants = {}
+
+    updates = {variants_field: variants}
+    if hasattr(model, "card_version"):
+        # The catalog card shows the new image
+        updates["card_version"] = F("card_version") + 1
+    # update() rather than save() so that no post_save handlers run again
+    model.objects.filter(pk=pk).update(**updates)
+    if model is Book:
+        save_book_cards(Book.objects.filter(pk=pk))
+    # Cached pages still have the old image markup
+    bump_catalog_version()
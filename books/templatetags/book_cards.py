@@ -0,0 +1,20 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from books.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def book_cards(context, books):
+    """Render the catalog cards of books through the card cache"""
+    request = context["request"]
+    html = render_cards(
+        books,
+        header_deferred=context.get("header_deferred", False),
+        user=context.get("header_user", request.user),
+        csrf_token=context.get("csrf_token", ""),
+        redirect_path=context.get("redirect_path") or request.path,
+    )
+    return mark_safe(html)
@@ -0,0 +1,9 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def facet_count(facets, category_id):
+    """The number of books a category link would show"""
+    return facets.category(category_id)
@@ -0,0 +1,43 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from books.images import FORMATS
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(
+    field_file, variants, alt="", sizes="100vw", css_class="", loading="lazy"
+):
+    """
+    Render an image with <source> elements listing its resized copies,
+    so browsers download the smallest file that fits the layout.
+    Falls back to a plain <img> until the copies have been generated.
+    """
+    img = format_html(
+        '<img class="{}" src="{}" alt="{}" loading="{}">',
+        css_class,
+        field_file.url,
+        alt,
+        loading,
+    )
+    if not variants or variants.get("source") != field_file.name:
+        return img
+
+    storage = field_file.storage
+    sources = []
+    for fmt in FORMATS:
+        widths = variants.get(fmt)
+        if not widths:
+            continue
+        srcset = ", ".join(
+            f"{storage.url(name)} {width}w" for width, name in widths.items()
+        )
+        sources.append((f"image/{fmt}", srcset, sizes))
+
+    return format_html(
+        "<picture>{}{}</picture>",
+        format_html_join("", '<source type="{}" srcset="{}" sizes="{}">', sources),
+        img,
+    )
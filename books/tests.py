@@ -1 +1,324 @@
-# Create your tests here.
+import base64
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import fuzzy, search
+from .catalog import CatalogQuery
+from .models import Book, BookCard, BookContributor, Publisher
+from .pagination import InvalidCursor, decode_cursor, get_ordering, paginate_books
+from .slugs import allocate_slugs
+
+
+def make_book(title, price="10.00", **fields):
+    return Book.objects.create(
+        title=title,
+        price=Decimal(price),
+        pages=100,
+        cover_type="hard",
+        illustration_type="none",
+        **fields,
+    )
+
+
+def make_cursor(values):
+    payload = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+class PaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Without the sample books of the migrations
+        Book.objects.all().delete()
+        # Ties on every sort key, so that pages end in the middle of a tie
+        prices = ["5.00", "5.00", "5.00", "7.50", "7.50", "9.99", "9.99"]
+        cls.books = [
+            make_book(f"Book {number}", price) for number, price in enumerate(prices)
+        ]
+        for book, popularity in zip(cls.books, [1, 3, 3, 3, 0, 0, 2]):
+            Book.objects.filter(pk=book.pk).update(popularity=popularity)
+
+    def walk(self, books, sort_option, page_size=2):
+        """The ids of every page of books, following the cursors"""
+        pages = []
+        cursor = None
+        while True:
+            page, cursor = paginate_books(books, sort_option, cursor, page_size)
+            pages.append([book.pk for book in page])
+            if cursor is None:
+                return pages
+
+    def test_pages_follow_the_ordering_without_duplicates_or_gaps(self):
+        for sort_option in ("price_asc", "price_desc", "popular", None):
+            for books in (Book.objects.all(), BookCard.objects.all()):
+                with self.subTest(sort=sort_option, model=books.model.__name__):
+                    pages = self.walk(books, sort_option)
+                    expected = list(
+                        books.order_by(*get_ordering(sort_option)).values_list(
+                            "pk", flat=True
+                        )
+                    )
+                    self.assertEqual(sum(pages, []), expected)
+                    self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+
+    def test_last_full_page_has_no_cursor(self):
+        page, cursor = paginate_books(Book.objects.all(), "price_asc", None, 7)
+        self.assertEqual(len(page), 7)
+        self.assertIsNone(cursor)
+
+    def test_malformed_cursors_are_rejected(self):
+        books = Book.objects.all()
+        ordering = get_ordering("price_asc")
+        for cursor in (
+            "zzz",
+            "!!!",
+            make_cursor({"price": "5.00"}),
+            make_cursor(["5.00"]),
+            make_cursor(["5.00", "1", "2"]),
+            make_cursor(["cheap", "1"]),
+            make_cursor(["5.00", "one"]),
+            make_cursor([["5.00"], "1"]),
+            make_cursor([None, None]),
+        ):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursor):
+                    decode_cursor(cursor, books, ordering)
+
+    def test_cursor_values_take_the_column_types(self):
+        values = decode_cursor(
+            make_cursor(["7.50", "4"]), Book.objects.all(), get_ordering("price_asc")
+        )
+        self.assertEqual(values, [Decimal("7.50"), 4])
+
+    def test_invalid_cursor_redirects_the_catalog(self):
+        for name in ("books", "home"):
+            with self.subTest(page=name):
+                url = reverse(name)
+                response = self.client.get(
+                    url, {"sort": "price_asc", "cursor": make_cursor(["x", "1"])}
+                )
+                self.assertRedirects(response, url)
+                messages = [str(m) for m in response.wsgi_request._messages]
+                self.assertEqual(messages, ["Invalid page"])
+
+    def test_invalid_cursor_is_a_bad_request_for_more_books(self):
+        for cursor in ("zzz", make_cursor(["5.00", "one"])):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(
+                    reverse("more_books"), {"sort": "price_asc", "cursor": cursor}
+                )
+                self.assertEqual(response.status_code, 400)
+
+    def test_more_books_continues_the_page(self):
+        page, cursor = paginate_books(BookCard.objects.all(), "price_desc", None, 3)
+        response = self.client.get(
+            reverse("more_books"), {"sort": "price_desc", "cursor": cursor}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json()["next_cursor"])
+        html = response.json()["html"]
+        first_page = {card.pk for card in page}
+        # The four books after the first page, and only those
+        for book in self.books:
+            with self.subTest(book=book.title):
+                shown = f'href="{reverse("book_detail", args=[book.slug])}"' in html
+                self.assertEqual(shown, book.pk not in first_page)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Book.objects.all().delete()
+        cls.kobzar = make_book("Кобзар")
+        shevchenko = BookContributor.objects.create(name="Тарас Шевченко")
+        cls.kobzar.authors.add(shevchenko)
+        cls.dragon = make_book("The Dragon Keeper")
+        cls.about_dragons = make_book(
+            "Fire and Ice", description="A tale of dragons and their keepers."
+        )
+
+    def found(self, text):
+        return list(
+            search.search(Book.objects.all(), text)
+            .order_by("-search_rank", "id")
+            .values_list("pk", flat=True)
+        )
+
+    def test_stemmer_strips_ukrainian_endings(self):
+        for word, stem in (
+            ("кобзаря", "кобзар"),
+            ("кобзарі", "кобзар"),
+            ("кобзарем", "кобзар"),
+            ("шевченка", "шевченк"),
+            ("шевченко", "шевченк"),
+        ):
+            with self.subTest(word=word):
+                self.assertEqual(search.stem_ukrainian(word), stem)
+
+    def test_stemmer_keeps_short_stems(self):
+        self.assertEqual(search.stem_ukrainian("або"), "або")
+
+    def test_prepare_text_only_stems_cyrillic_words(self):
+        self.assertEqual(search.prepare_text("Кобзаря, Dragons!"), "кобзар dragons")
+
+    def test_ukrainian_inflections_match(self):
+        for text in ("кобзаря", "Кобзарі", "шевченка кобзар"):
+            with self.subTest(text=text):
+                self.assertEqual(self.found(text), [self.kobzar.pk])
+
+    def test_english_plurals_match(self):
+        # The title outweighs the description
+        both = [self.dragon.pk, self.about_dragons.pk]
+        self.assertEqual(self.found("dragons"), both)
+        self.assertEqual(self.found("keeper"), both)
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.found("dragon fire"), [self.about_dragons.pk])
+        self.assertEqual(self.found("dragon кобзар"), [])
+
+    def test_index_follows_changes(self):
+        self.dragon.title = "The Unicorn Keeper"
+        self.dragon.save()
+        self.assertEqual(self.found("unicorn"), [self.dragon.pk])
+        self.assertEqual(self.found("dragon"), [self.about_dragons.pk])
+        self.about_dragons.delete()
+        self.assertEqual(self.found("dragon"), [])
+
+    def test_no_words_match_nothing(self):
+        for text in ("", "  ", "!?, -"):
+            with self.subTest(text=text):
+                books = search.search(Book.objects.all(), text)
+                self.assertEqual(list(books.order_by("-search_rank")), [])
+
+    def test_catalog_search_without_the_index(self):
+        with mock.patch.object(search, "is_available", return_value=False):
+            catalog = CatalogQuery({"q": "Dragon"})
+            self.assertIsNone(catalog.sort_key)
+            books = catalog.search().order_by("pk")
+            self.assertEqual(list(books), [self.dragon, self.about_dragons])
+
+    def test_punctuation_only_search_browses_the_catalog(self):
+        response = self.client.get(reverse("books"), {"q": "?!"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["books"]), 3)
+
+    def test_empty_search_redirects(self):
+        response = self.client.get(reverse("books"), {"q": " "})
+        self.assertRedirects(response, reverse("books"))
+
+
+class FuzzySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Book.objects.all().delete()
+        cls.kobzar = make_book("Кобзар")
+        cls.kobzar.authors.add(BookContributor.objects.create(name="Тарас Шевченко"))
+        cls.snow_queen = make_book("The Snow Queen")
+
+    def found(self, text):
+        catalog = CatalogQuery({"q": text})
+        page, next_cursor = catalog.paginate()
+        return catalog, [book.pk for book in page]
+
+    def test_fold_transliterates_and_folds_spellings(self):
+        for text in ("Шевченко", "Shevchenko", "ШЕВЧЕНКО!"):
+            with self.subTest(text=text):
+                self.assertEqual(fuzzy.fold(text), "shevchenko")
+        self.assertEqual(fuzzy.fold("Гоголь / Gogol"), "hohol hohol")
+        self.assertEqual(fuzzy.fold("Щедрик"), fuzzy.fold("Schedryk"))
+
+    def test_search_names_are_folded(self):
+        self.kobzar.refresh_from_db()
+        self.assertEqual(self.kobzar.search_names, "kobzar taras shevchenko")
+
+    def test_misspelled_title(self):
+        catalog, found = self.found("snow quen")
+        self.assertTrue(catalog.fuzzy)
+        self.assertEqual(found, [self.snow_queen.pk])
+
+    def test_transliterated_author(self):
+        for text in ("shevchenko", "Schevchenko", "taras shevcenko"):
+            with self.subTest(text=text):
+                catalog, found = self.found(text)
+                self.assertTrue(catalog.fuzzy)
+                self.assertEqual(found, [self.kobzar.pk])
+
+    def test_exact_matches_are_not_fuzzy(self):
+        catalog, found = self.found("snow")
+        self.assertFalse(catalog.fuzzy)
+        self.assertEqual(found, [self.snow_queen.pk])
+
+    def test_below_the_similarity_threshold(self):
+        similarities = fuzzy.TrigramIndex.build(0).match(fuzzy.fold("kobzyk"))
+        self.assertEqual(similarities, {})
+        similarities = fuzzy.TrigramIndex.build(0).match(fuzzy.fold("kobzr"))
+        self.assertGreaterEqual(
+            similarities[self.kobzar.pk], fuzzy.WORD_SIMILARITY_THRESHOLD
+        )
+
+    def test_no_match_keeps_search_rank(self):
+        books = fuzzy.search(Book.objects.all(), "qwxzv")
+        self.assertEqual(list(books.order_by("-search_rank", "-id")), [])
+
+        catalog, found = self.found("qwxzv")
+        self.assertTrue(catalog.fuzzy)
+        self.assertEqual(catalog.sort_key, "relevance")
+        self.assertEqual(found, [])
+        response = self.client.get(reverse("books"), {"q": "qwxzv"})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(DEBUG=True)
+    def test_kept_index_follows_changes(self):
+        self.assertEqual(self.found("snow quen")[1], [self.snow_queen.pk])
+        self.snow_queen.title = "The Ice Queen"
+        self.snow_queen.save()
+        self.assertEqual(self.found("snow quen")[1], [])
+        self.assertEqual(self.found("ice quen")[1], [self.snow_queen.pk])
+
+
+class SlugTests(TestCase):
+    LONG_TITLE = "The Remarkable and Entirely True Adventures of Captain Blackbeard"
+
+    def setUp(self):
+        Book.objects.all().delete()
+
+    def test_colliding_names_in_one_batch(self):
+        make_book("Kobzar")
+        slugs = allocate_slugs(Book, ["Kobzar", "Snow", "kobzar", "KOBZAR!", "Snow"])
+        self.assertEqual(slugs, ["kobzar-2", "snow", "kobzar-3", "kobzar-4", "snow-2"])
+
+    def test_cyrillic_is_transliterated(self):
+        self.assertEqual(
+            allocate_slugs(Publisher, ["Видавництво Старого Лева", "Абабагаламага"]),
+            ["vidavnitstvo-starogo-leva", "ababagalamaga"],
+        )
+        book = make_book("Кобзар")
+        self.assertEqual(book.slug, "kobzar")
+        self.assertEqual(make_book("Кобзар").slug, "kobzar-2")
+
+    def test_names_without_letters_fall_back_to_the_model_name(self):
+        self.assertEqual(
+            allocate_slugs(Publisher, ["???", "!"]), ["publisher", "publisher-2"]
+        )
+
+    def test_long_names_are_cut_to_the_slug_field(self):
+        max_length = Book._meta.get_field("slug").max_length
+        slugs = [make_book(self.LONG_TITLE).slug for _ in range(12)]
+
+        self.assertEqual(slugs[0], "the-remarkable-and-entirely-true-adventures-of")
+        self.assertEqual(len(set(slugs)), len(slugs))
+        for number, slug in enumerate(slugs[1:], 2):
+            with self.subTest(slug=slug):
+                self.assertLessEqual(len(slug), max_length)
+                self.assertTrue(slug.endswith(f"-{number}"))
+                self.assertTrue(slug.startswith("the-remarkable-and-entirely-true"))
+
+    def test_suffixes_of_a_cut_slug_are_found(self):
+        base = "a" * 50
+        for slug in (base, base[:48] + "-2", base[:48] + "-3"):
+            make_book("Taken", slug=slug)
+        self.assertEqual(allocate_slugs(Book, ["A" * 60]), [base[:48] + "-4"])
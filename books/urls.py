@@ -3,6 +3,9 @@ from . import views
 
 urlpatterns = [
     path("", views.all_books, name="books"),
+    path("more/", views.more_books, name="more_books"),
+    path("suggest/", views.suggest, name="suggest_books"),
+    path("export/", views.export_books, name="export_books"),
     path("add_book/", views.add_book, name="add_book"),
     path("delete/<int:book_id>/", views.delete_book, name="delete_book"),
     path("edit/<int:book_id>/", views.edit_book, name="edit_book"),
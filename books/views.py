@@ -1,102 +1,112 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Q
+from django.http import HttpResponseBadRequest, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
-from .models import Book, Category
+from .catalog import PAGE_FIELDS, CatalogQuery, InvalidCatalogQuery
+from .category_tree import CategoryTree
+from .exports import (
+    BOOK_COLUMNS,
+    EXPORT_FORMATS,
+    book_records,
+    export_lines,
+    export_response,
+)
+from .facets import Facets
+from .models import Book
+from .page_cache import SHARED_MAX_AGE, cache_shared_page
 from .forms import BookForm
-import re
+from .pagination import InvalidCursor, get_next_page_url
+from .suggest import get_suggestions
 
 
+@cache_shared_page
 def all_books(request):
-    books = Book.objects.all()
-    query = None
-    categories = None
-
-    if request.GET:
-        if "subcategory" in request.GET and "parent" in request.GET:
-            try:
-                subcategory_id = int(request.GET["subcategory"])
-                parent_id = int(request.GET["parent"])
-                books = books.filter(
-                    categories__id=subcategory_id, categories__parent_id=parent_id
-                )
-                categories = Category.objects.filter(id=subcategory_id)
-            except ValueError:
-                messages.error(request, "Invalid category selection")
-                return redirect(reverse("books"))
-
-        elif "category" in request.GET:
-            try:
-                category_ids = [int(cid) for cid in request.GET["category"].split(",")]
-
-                # Get all subcategories where parent is in category_ids
-                subcategory_ids = Category.objects.filter(
-                    parent_id__in=category_ids
-                ).values_list("id", flat=True)
-
-                # Get books tagged with any of those subcategories
-                books = books.filter(categories__id__in=subcategory_ids)
-
-                categories = Category.objects.filter(id__in=category_ids)
-
-            except ValueError:
-                messages.error(request, "Invalid category selection")
-                return redirect(reverse("books"))
-
-        if "q" in request.GET:
-            query = request.GET["q"]
-            if not query.strip():
-                messages.error(request, "Enter your search criteria")
-                return redirect(reverse("books"))
-
-            # Split query into individual words
-            words = query.strip().split()
-            words = re.findall(r"\w+", query.lower())
-
-            # Build a combined Q object that requires each word to match
-            # at least one field
-            for word in words:
-                word_queries = (
-                    Q(title__icontains=word)
-                    | Q(description__icontains=word)
-                    | Q(authors__name__icontains=word)
-                    | Q(publisher__name__icontains=word)
-                )
-
-                books = books.filter(word_queries)
+    try:
+        catalog = CatalogQuery(request.GET)
+    except InvalidCatalogQuery as e:
+        messages.error(request, str(e))
+        return redirect(reverse("books"))
+
+    try:
+        books, next_cursor = catalog.paginate(request.GET.get("cursor"))
+    except InvalidCursor:
+        messages.error(request, "Invalid page")
+        return redirect(reverse("books"))
+
+    categories = CategoryTree.get()
+    context = {
+        "books": books,
+        "search_term": catalog.search_term,
+        "fuzzy_search": catalog.fuzzy,
+        "current_categories": catalog.current_categories,
+        "categories": categories,
+        "facets": Facets.get(catalog, categories),
+        "sort_option": catalog.sort_option,
+        "language": catalog.language,
+        "next_cursor": next_cursor,
+        "next_page_url": get_next_page_url(request, next_cursor),
+    }
 
-    sort_option = request.GET.get("sort")
+    return render(request, "books/books.html", context)
 
-    if sort_option == "price_asc":
-        books = books.order_by("price")
-    elif sort_option == "price_desc":
-        books = books.order_by("-price")
 
-    language = request.GET.get("language")
-    if language in ["ukr", "eng"]:
-        books = books.filter(language=language)
+@cache_shared_page
+def more_books(request):
+    """
+    Return the next page of catalog cards as an HTML fragment wrapped
+    in JSON, for infinite scrolling
+    """
+    try:
+        catalog = CatalogQuery(request.GET)
+        books, next_cursor = catalog.paginate(request.GET.get("cursor"))
+    except InvalidCatalogQuery as e:
+        return HttpResponseBadRequest(str(e))
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor")
+
+    # The cards post back to the page they are shown on, not to this endpoint
+    redirect_path = request.GET.get("path", reverse("books"))
+    if not url_has_allowed_host_and_scheme(redirect_path, allowed_hosts=None):
+        redirect_path = reverse("books")
+
+    html = render_to_string(
+        "includes/catalog_cards.html",
+        {"books": books, "redirect_path": redirect_path},
+        request=request,
+    )
 
-    active_categories = Category.objects.filter(parent=None, active=True).order_by(
-        "order"
+    return JsonResponse(
+        {
+            "html": html,
+            "next_cursor": next_cursor,
+            "next_page_url": get_next_page_url(request, next_cursor),
+        }
     )
-    for category in active_categories:
-        category.visible_subcategories = category.subcategories.filter(
-            active=True
-        ).order_by("order")
 
-    context = {
-        "books": books,
-        "search_term": query,
-        "current_categories": categories,
-        "categories": active_categories,
-        "sort_option": sort_option,
-        "language": language,
-    }
 
-    return render(request, "books/books.html", context)
+def suggest(request):
+    """
+    Return typeahead suggestions for the search box as JSON, from the
+    in-process prefix index
+    """
+    suggestions = get_suggestions(request.GET.get("q", ""))
+    response = JsonResponse(
+        {
+            "suggestions": [
+                {"kind": kind, "label": label, "url": url}
+                for kind, label, url in suggestions
+            ]
+        }
+    )
+    patch_cache_control(response, public=True, max_age=SHARED_MAX_AGE)
+    return response
 
 
+@cache_shared_page
 def book_detail(request, slug):
     """A view to show book details"""
 
@@ -111,17 +121,18 @@ def book_detail(request, slug):
 
             return redirect(f"{reverse('books')}?q={query}")
 
-    active_categories = Category.objects.filter(parent=None, active=True).order_by(
-        "order"
+    # Cards of the books most often bought with this one, see
+    # books.recommendations
+    related_books = (
+        Book.objects.filter(related_to__book=book)
+        .order_by("related_to__rank")
+        .only(*PAGE_FIELDS)
     )
-    for category in active_categories:
-        category.visible_subcategories = category.subcategories.filter(
-            active=True
-        ).order_by("order")
 
     context = {
         "book": book,
-        "categories": active_categories,
+        "categories": CategoryTree.get(),
+        "related_books": related_books,
     }
 
     return render(request, "books/book_detail.html", context)
@@ -199,3 +210,17 @@ def delete_book(request, book_id):
     book.delete()
     messages.success(request, "Book deleted")
     return redirect(reverse("books"))
+
+
+@login_required
+def export_books(request):
+    """Stream the catalog as a CSV or JSON lines download"""
+    if not request.user.is_superuser:
+        messages.error(request, "Only store owners can export the catalog.")
+        return redirect(reverse("home"))
+
+    file_format = request.GET.get("format", "csv")
+    if file_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unknown export format.")
+    lines = export_lines(book_records(), BOOK_COLUMNS, file_format)
+    return export_response(lines, "books", file_format)
@@ -1,47 +1,100 @@
 from decimal import Decimal
 from django.conf import settings
-from django.shortcuts import get_object_or_404
+from django.utils.functional import (
+    SimpleLazyObject,
+    cached_property,
+    new_method_proxy,
+)
 from books.models import Book
 
 
-def cart_contents(request):
+class LazyValue(SimpleLazyObject):
+    """A lazy number that templates can also format, e.g. with localization"""
+
+    __format__ = new_method_proxy(format)
+
+
+class CartSummary:
+    """
+    The lines and totals of a session cart, loaded the first time any
+    of them is read
+    """
 
-    cart_items = []
-    total = 0
-    quantity = 0
-    cart = request.session.get("cart", {})
-
-    for item_id, qty in cart.items():
-        book = get_object_or_404(Book, pk=item_id)
-        item_total = qty * book.price
-        total += item_total
-        quantity += qty
-        cart_items.append(
-            {
-                "item_id": item_id,
-                "quantity": qty,
-                "book": book,
-                "total": item_total,
-            }
+    def __init__(self, cart):
+        self.cart = cart
+
+    @cached_property
+    def items(self):
+        # One query for all the books in the cart, with their authors
+        books = Book.objects.prefetch_related("authors").in_bulk(
+            [int(item_id) for item_id in self.cart]
         )
 
-    if total < settings.FREE_DELIVERY_THRESHOLD:
-        delivery = total * Decimal(settings.STANDARD_DELIVERY_PERCENTAGE / 100)
-        free_delivery_delta = settings.FREE_DELIVERY_THRESHOLD - total
-    else:
-        delivery = 0
-        free_delivery_delta = 0
+        cart_items = []
+        for item_id, qty in self.cart.items():
+            book = books.get(int(item_id))
+            if book is None:
+                # The book was removed from the catalog
+                continue
+            cart_items.append(
+                {
+                    "item_id": item_id,
+                    "quantity": qty,
+                    "book": book,
+                    "total": qty * book.price,
+                }
+            )
+        return cart_items
+
+    @cached_property
+    def total(self):
+        return sum((item["total"] for item in self.items), 0)
+
+    @cached_property
+    def quantity(self):
+        return sum(item["quantity"] for item in self.items)
+
+    @cached_property
+    def delivery(self):
+        if self.total < settings.FREE_DELIVERY_THRESHOLD:
+            return self.total * Decimal(settings.STANDARD_DELIVERY_PERCENTAGE / 100)
+        return 0
+
+    @cached_property
+    def free_delivery_delta(self):
+        if self.total < settings.FREE_DELIVERY_THRESHOLD:
+            return settings.FREE_DELIVERY_THRESHOLD - self.total
+        return 0
+
+    @cached_property
+    def grand_total(self):
+        return self.delivery + self.total
+
+
+def get_cart_summary(request):
+    """The CartSummary of the session cart, shared within a request"""
+    if not hasattr(request, "_cart_summary"):
+        request._cart_summary = CartSummary(request.session.get("cart", {}))
+    return request._cart_summary
+
+
+def cart_contents(request):
+    """
+    Add the cart to every template context. The values are lazy, so
+    pages that never show the cart never read the session or query it.
+    """
 
-    grand_total = delivery + total
+    def lazy(attribute):
+        return LazyValue(lambda: getattr(get_cart_summary(request), attribute))
 
     context = {
-        "cart_items": cart_items,
-        "total": total,
-        "quantity": quantity,
-        "delivery": delivery,
-        "free_delivery_delta": free_delivery_delta,
+        "cart_items": lazy("items"),
+        "total": lazy("total"),
+        "quantity": lazy("quantity"),
+        "delivery": lazy("delivery"),
+        "free_delivery_delta": lazy("free_delivery_delta"),
         "free_delivery_threshold": settings.FREE_DELIVERY_THRESHOLD,
-        "grand_total": grand_total,
+        "grand_total": lazy("grand_total"),
     }
 
     return context
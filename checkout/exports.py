@@ -0,0 +1,89 @@
+"""
+Streaming order exports, see books.exports.
+
+In JSON lines there is one object per order with a list of its line
+items. In CSV there is one row per line item, repeating the columns of
+its order.
+"""
+
+from django.db.models import Prefetch
+
+from books.exports import CHUNK_SIZE, export_lines
+from books.models import Book
+from .models import Order, OrderLineItem
+
+ORDER_COLUMNS = (
+    "order_number",
+    "date",
+    "full_name",
+    "email",
+    "phone_number",
+    "country",
+    "postcode",
+    "town_or_city",
+    "street_address1",
+    "street_address2",
+    "county",
+    "delivery_cost",
+    "order_total",
+    "grand_total",
+    "stripe_pid",
+)
+LINE_ITEM_COLUMNS = ("book_id", "sku", "title", "quantity", "lineitem_total")
+
+
+def orders_between(since=None, until=None):
+    """The orders placed from the since date to the until date, inclusive"""
+    orders = Order.objects.all()
+    if since:
+        orders = orders.filter(date__date__gte=since)
+    if until:
+        orders = orders.filter(date__date__lte=until)
+    return orders
+
+
+def order_records(orders=None, chunk_size=CHUNK_SIZE):
+    """Yield a dict per order, with its line items"""
+    if orders is None:
+        orders = Order.objects.all()
+    line_items = (
+        OrderLineItem.objects.order_by("pk")
+        .only("order_id", "book_id", "quantity", "lineitem_total")
+        .prefetch_related(
+            Prefetch("book", queryset=Book.objects.only("sku", "title"))
+        )
+    )
+    orders = (
+        orders.order_by("pk")
+        .only(*ORDER_COLUMNS)
+        .prefetch_related(Prefetch("lineitems", queryset=line_items))
+    )
+    for order in orders.iterator(chunk_size=chunk_size):
+        record = {column: getattr(order, column) for column in ORDER_COLUMNS}
+        record["lineitems"] = [
+            {
+                "book_id": item.book_id,
+                "sku": item.book.sku,
+                "title": item.book.title,
+                "quantity": item.quantity,
+                "lineitem_total": item.lineitem_total,
+            }
+            for item in order.lineitems.all()
+        ]
+        yield record
+
+
+def line_item_records(orders=None, chunk_size=CHUNK_SIZE):
+    """Yield a flat dict per line item, with the columns of its order"""
+    for record in order_records(orders, chunk_size):
+        for item in record.pop("lineitems"):
+            yield {**record, **item}
+
+
+def order_export_lines(file_format, orders=None):
+    """The lines of an order export file, see books.exports.export_lines"""
+    if file_format == "csv":
+        return export_lines(
+            line_item_records(orders), ORDER_COLUMNS + LINE_ITEM_COLUMNS, "csv"
+        )
+    return export_lines(order_records(orders), ORDER_COLUMNS, file_format)
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from books.exports import EXPORT_FORMATS
+from checkout.exports import order_export_lines, orders_between
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the orders as CSV (a row per line item) or JSON lines "
+        "(an object per order), streaming"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=list(EXPORT_FORMATS), default="csv", help="Default csv."
+        )
+        parser.add_argument(
+            "--output", help="The file to write, standard output by default."
+        )
+        parser.add_argument(
+            "--since", type=date.fromisoformat, help="First order date, YYYY-MM-DD."
+        )
+        parser.add_argument(
+            "--until", type=date.fromisoformat, help="Last order date, YYYY-MM-DD."
+        )
+
+    def handle(self, *args, **options):
+        orders = orders_between(options["since"], options["until"])
+        lines = order_export_lines(options["format"], orders)
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
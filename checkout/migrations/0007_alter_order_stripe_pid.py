@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 20:05
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def clean_stripe_pids(apps, schema_editor):
+    """
+    Orders without a PaymentIntent get NULL instead of an empty string,
+    and duplicate orders for the same PaymentIntent are marked so that
+    the unique constraint can be added. The oldest order keeps the id.
+    """
+    Order = apps.get_model("checkout", "Order")
+    Order.objects.filter(stripe_pid="").update(stripe_pid=None)
+
+    duplicate_pids = (
+        Order.objects.exclude(stripe_pid=None)
+        .values("stripe_pid")
+        .annotate(orders=Count("pk"))
+        .filter(orders__gt=1)
+        .values_list("stripe_pid", flat=True)
+    )
+    for pid in list(duplicate_pids):
+        for order in Order.objects.filter(stripe_pid=pid).order_by("date", "pk")[1:]:
+            order.stripe_pid = f"{pid}:duplicate:{order.pk}"
+            order.save(update_fields=["stripe_pid"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('checkout', '0006_alter_order_country'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='stripe_pid',
+            field=models.CharField(blank=True, max_length=254, null=True),
+        ),
+        migrations.RunPython(clean_stripe_pids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='stripe_pid',
+            field=models.CharField(blank=True, max_length=254, null=True, unique=True),
+        ),
+    ]
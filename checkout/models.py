@@ -41,7 +41,9 @@ class Order(models.Model):
         max_digits=10, decimal_places=2, null=False, default=0
     )
     original_cart = models.TextField(null=False, blank=False, default="")
-    stripe_pid = models.CharField(max_length=254, null=False, blank=False, default="")
+    # One order per PaymentIntent, whichever of the checkout view and the
+    # webhook gets to create it first
+    stripe_pid = models.CharField(max_length=254, null=True, blank=True, unique=True)
 
     def _generate_order_number(self):
         """
@@ -49,14 +51,12 @@ class Order(models.Model):
         """
         return uuid.uuid4().hex.upper()
 
-    def update_total(self):
+    def set_totals(self, order_total):
         """
-        Update grand total each time a line item is added,
-        accounting for delivery costs.
+        Set the order total and derive the delivery cost
+        and grand total from it.
         """
-        self.order_total = (
-            self.lineitems.aggregate(Sum("lineitem_total"))["lineitem_total__sum"] or 0
-        )
+        self.order_total = order_total
         if self.order_total < settings.FREE_DELIVERY_THRESHOLD:
             self.delivery_cost = (
                 self.order_total * settings.STANDARD_DELIVERY_PERCENTAGE / 100
@@ -64,6 +64,15 @@ class Order(models.Model):
         else:
             self.delivery_cost = 0
         self.grand_total = self.order_total + self.delivery_cost
+
+    def update_total(self):
+        """
+        Update grand total each time a line item is added,
+        accounting for delivery costs.
+        """
+        self.set_totals(
+            self.lineitems.aggregate(Sum("lineitem_total"))["lineitem_total__sum"] or 0
+        )
         self.save()
 
     def save(self, *args, **kwargs):
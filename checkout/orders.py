@@ -0,0 +1,44 @@
+from django.db import transaction
+
+from books.models import Book
+from .models import OrderLineItem
+
+
+def create_order(order, cart):
+    """
+    Save a new order together with a line item for every book in the cart.
+
+    All books are loaded with one query, the totals are computed once and
+    the order is saved once, then the line items are inserted in bulk.
+    bulk_create does not send post_save, so the per-line total update in
+    checkout.signals only runs for line items saved one at a time, such as
+    admin inline edits.
+
+    Raises Book.DoesNotExist if a book in the cart is no longer in the
+    catalog and IntegrityError if an order already exists for the
+    order's PaymentIntent. Nothing is saved in either case.
+    """
+    with transaction.atomic():
+        books = Book.objects.in_bulk([int(item_id) for item_id in cart])
+
+        line_items = []
+        for item_id, quantity in cart.items():
+            book = books.get(int(item_id))
+            if book is None:
+                raise Book.DoesNotExist(f"Book {item_id} does not exist")
+            line_items.append(
+                OrderLineItem(
+                    book=book,
+                    quantity=quantity,
+                    lineitem_total=book.price * quantity,
+                )
+            )
+
+        order.set_totals(sum((item.lineitem_total for item in line_items), 0))
+        order.save()
+
+        for item in line_items:
+            item.order = order
+        OrderLineItem.objects.bulk_create(line_items)
+
+    return order
@@ -0,0 +1,21 @@
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+from django.conf import settings
+
+from .models import Order
+
+
+def send_confirmation_email(order_id):
+    """Send the customer a confirmation email for an order"""
+    order = Order.objects.get(pk=order_id)
+    cust_email = order.email
+    subject = render_to_string(
+        "checkout/confirmation_emails/confirmation_email_subject.txt",
+        {"order": order},
+    )
+    body = render_to_string(
+        "checkout/confirmation_emails/confirmation_email_body.txt",
+        {"order": order, "contact_email": settings.DEFAULT_FROM_EMAIL},
+    )
+
+    send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [cust_email])
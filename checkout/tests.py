@@ -1 +1,97 @@
-# Create your tests here.
+from decimal import Decimal
+
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from books.models import Book
+from .models import Order, OrderLineItem
+from .orders import create_order
+
+
+def make_book(title, price):
+    return Book.objects.create(
+        title=title,
+        price=Decimal(price),
+        pages=100,
+        cover_type="hard",
+        illustration_type="none",
+    )
+
+
+def make_order(**fields):
+    return Order(
+        full_name="Taras Shevchenko",
+        email="taras@example.com",
+        phone_number="0123456789",
+        town_or_city="Kyiv",
+        street_address1="1 Khreshchatyk",
+        **fields,
+    )
+
+
+class CreateOrderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.kobzar = make_book("Kobzar", "12.50")
+        cls.snow_queen = make_book("The Snow Queen", "9.99")
+
+    def cart(self, *items):
+        # Session carts are keyed by the book id as a string
+        return {str(book.pk): quantity for book, quantity in items}
+
+    def test_totals_and_delivery(self):
+        cart = self.cart((self.kobzar, 2), (self.snow_queen, 1))
+        order = create_order(make_order(), cart)
+
+        order.refresh_from_db()
+        self.assertEqual(order.order_total, Decimal("34.99"))
+        # Below the free delivery threshold, delivery is 10% of the total
+        self.assertEqual(order.delivery_cost, Decimal("3.50"))
+        self.assertEqual(order.grand_total, Decimal("38.49"))
+        line_items = order.lineitems.values_list(
+            "book__title", "quantity", "lineitem_total"
+        )
+        self.assertEqual(
+            sorted(line_items),
+            [("Kobzar", 2, Decimal("25.00")), ("The Snow Queen", 1, Decimal("9.99"))],
+        )
+
+    def test_free_delivery(self):
+        order = create_order(make_order(), self.cart((self.kobzar, 4)))
+
+        order.refresh_from_db()
+        self.assertEqual(order.order_total, Decimal("50.00"))
+        self.assertEqual(order.delivery_cost, Decimal("0"))
+        self.assertEqual(order.grand_total, Decimal("50.00"))
+
+    def test_order_is_saved_once_and_line_items_in_bulk(self):
+        cart = self.cart((self.kobzar, 1), (self.snow_queen, 3))
+        with CaptureQueriesContext(connection) as queries:
+            create_order(make_order(), cart)
+
+        statements = [query["sql"].split()[0] for query in queries]
+        self.assertEqual(statements.count("SELECT"), 1)
+        self.assertEqual(statements.count("INSERT"), 2)
+        self.assertNotIn("UPDATE", statements)
+
+    def test_missing_book_saves_nothing(self):
+        cart = self.cart((self.kobzar, 1))
+        cart["999999"] = 1
+
+        with self.assertRaises(Book.DoesNotExist):
+            create_order(make_order(), cart)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(OrderLineItem.objects.exists())
+
+    def test_second_order_for_a_payment_intent_saves_nothing(self):
+        create_order(make_order(stripe_pid="pi_1"), self.cart((self.kobzar, 1)))
+
+        with self.assertRaises(IntegrityError):
+            create_order(
+                make_order(stripe_pid="pi_1"), self.cart((self.snow_queen, 2))
+            )
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(
+            list(OrderLineItem.objects.values_list("book", flat=True)), [self.kobzar.pk]
+        )
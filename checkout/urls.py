@@ -10,5 +10,6 @@ urlpatterns = [
         name="checkout_success",
     ),
     path("cache_checkout_data/", views.cache_checkout_data, name="cache_checkout_data"),
+    path("export/", views.export_orders, name="export_orders"),
     path("wh/", webhook, name="webhook"),
 ]
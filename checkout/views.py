@@ -1,19 +1,26 @@
 from django.shortcuts import render, redirect, reverse, get_object_or_404, HttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib import messages
+from django.contrib.auth.decorators import login_required
 from django.conf import settings
+from django.http import HttpResponseBadRequest
+from django.utils.dateparse import parse_date
+from django.db import IntegrityError
 
+from .exports import order_export_lines, orders_between
 from .forms import OrderForm
-from .models import Order, OrderLineItem
+from .models import Order
+from .orders import create_order
 from .webhook_handler import StripeWH_Handler
-from books.models import Book
 from profiles.forms import UserProfileForm
 from profiles.models import UserProfile
-from cart.contexts import cart_contents
+from books.exports import EXPORT_FORMATS, export_response
+from cart.contexts import CartSummary
 from django.views.decorators.csrf import csrf_exempt
 
-import stripe
+import hashlib
 import json
+import stripe
 
 
 @require_POST
@@ -48,6 +55,49 @@ def cache_checkout_data(request):
         return HttpResponse(content=e, status=400)
 
 
+def get_payment_intent_secret(request, cart, amount):
+    """
+    Return the client secret of the PaymentIntent for this session's cart.
+
+    The intent is kept in the session and reused across checkout page
+    views. Stripe is only called to create it, or to update its amount
+    when the cart total has changed.
+    """
+    cart_hash = hashlib.sha256(json.dumps(cart, sort_keys=True).encode()).hexdigest()
+    cached = request.session.get("payment_intent")
+    if cached and Order.objects.filter(stripe_pid=cached["id"]).exists():
+        # Already paid, its order created by the webhook even though the
+        # customer never reached the success page
+        cached = None
+
+    if cached and (cached["cart_hash"], cached["amount"]) == (cart_hash, amount):
+        return cached["client_secret"]
+
+    if cached:
+        if cached["amount"] != amount:
+            try:
+                stripe.PaymentIntent.modify(cached["id"], amount=amount)
+            except stripe.error.InvalidRequestError:
+                # The intent can no longer be changed, e.g. it was cancelled
+                cached = None
+        if cached:
+            cached.update(cart_hash=cart_hash, amount=amount)
+            request.session["payment_intent"] = cached
+            return cached["client_secret"]
+
+    intent = stripe.PaymentIntent.create(
+        amount=amount,
+        currency=settings.STRIPE_CURRENCY,
+    )
+    request.session["payment_intent"] = {
+        "id": intent.id,
+        "client_secret": intent.client_secret,
+        "amount": amount,
+        "cart_hash": cart_hash,
+    }
+    return intent.client_secret
+
+
 def checkout(request):
     stripe_public_key = settings.STRIPE_PUBLIC_KEY
     stripe_secret_key = settings.STRIPE_SECRET_KEY
@@ -57,16 +107,12 @@ def checkout(request):
         messages.error(request, "Your cart is empty")
         return redirect(reverse("books"))
 
-    current_cart = cart_contents(request)
-    total = current_cart["grand_total"]
+    total = CartSummary(cart).grand_total
     stripe_total = round(total * 100)
     stripe.api_key = stripe_secret_key
 
     try:
-        intent = stripe.PaymentIntent.create(
-            amount=stripe_total,
-            currency=settings.STRIPE_CURRENCY,
-        )
+        client_secret = get_payment_intent_secret(request, cart, stripe_total)
     except stripe.error.StripeError:
         messages.error(
             request, "There was an issue connecting to Stripe. Please try again later."
@@ -93,17 +139,14 @@ def checkout(request):
             pid = request.POST.get("client_secret").split("_secret")[0]
             order.stripe_pid = pid
             order.original_cart = json.dumps(cart)
-            order.save()
-            order.save()
-
-            for item_id, quantity in cart.items():
-                book = Book.objects.get(id=item_id)
-                order_line_item = OrderLineItem(
-                    order=order,
-                    book=book,
-                    quantity=quantity,
-                )
-                order_line_item.save()
+
+            try:
+                order = create_order(order, cart)
+            except IntegrityError:
+                # The webhook already created the order for this payment
+                order = Order.objects.filter(stripe_pid=pid).first()
+                if order is None:
+                    raise
 
             request.session["save_info"] = "save-info" in request.POST
             return redirect(reverse("checkout_success", args=[order.order_number]))
@@ -118,7 +161,7 @@ def checkout(request):
             context = {
                 "order_form": order_form,
                 "stripe_public_key": stripe_public_key,
-                "client_secret": intent.client_secret,
+                "client_secret": client_secret,
             }
             return render(request, template, context)
     else:
@@ -155,7 +198,7 @@ def checkout(request):
         context = {
             "order_form": order_form,
             "stripe_public_key": stripe_public_key,
-            "client_secret": intent.client_secret,
+            "client_secret": client_secret,
         }
 
         return render(request, template, context)
@@ -198,6 +241,8 @@ def checkout_success(request, order_number):
 
     if "cart" in request.session:
         del request.session["cart"]
+    # The intent is paid, the next checkout needs a new one
+    request.session.pop("payment_intent", None)
 
     template = "checkout/checkout_success.html"
     context = {
@@ -207,6 +252,33 @@ def checkout_success(request, order_number):
     return render(request, template, context)
 
 
+@login_required
+def export_orders(request):
+    """
+    Stream the orders as a CSV or JSON lines download, optionally only
+    those placed between the since and until dates
+    """
+    if not request.user.is_superuser:
+        messages.error(request, "Only store owners can export orders.")
+        return redirect(reverse("home"))
+
+    file_format = request.GET.get("format", "csv")
+    if file_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("Unknown export format.")
+    dates = {}
+    for param in ("since", "until"):
+        value = request.GET.get(param)
+        if value:
+            try:
+                dates[param] = parse_date(value)
+            except ValueError:
+                dates[param] = None
+            if dates[param] is None:
+                return HttpResponseBadRequest(f"Invalid {param} date.")
+    lines = order_export_lines(file_format, orders_between(**dates))
+    return export_response(lines, "orders", file_format)
+
+
 @csrf_exempt
 def stripe_webhook(request):
     """Stripe webhook handler"""
@@ -1,15 +1,14 @@
 from django.http import HttpResponse
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import IntegrityError
 
-from .models import Order, OrderLineItem
-from books.models import Book
+from .models import Order
+from .orders import create_order
+from .tasks import send_confirmation_email
+from jobs.queue import enqueue
 from profiles.models import UserProfile
 
 import json
-import time
 
 
 class StripeWH_Handler:
@@ -19,18 +18,8 @@ class StripeWH_Handler:
         self.request = request
 
     def _send_confirmation_email(self, order):
-        """Send the user a confirmation email"""
-        cust_email = order.email
-        subject = render_to_string(
-            "checkout/confirmation_emails/confirmation_email_subject.txt",
-            {"order": order},
-        )
-        body = render_to_string(
-            "checkout/confirmation_emails/confirmation_email_body.txt",
-            {"order": order, "contact_email": settings.DEFAULT_FROM_EMAIL},
-        )
-
-        send_mail(subject, body, settings.DEFAULT_FROM_EMAIL, [cust_email])
+        """Queue the confirmation email so the webhook can return at once"""
+        enqueue(send_confirmation_email, order.pk)
 
     def handle_event(self, event):
         """
@@ -56,7 +45,6 @@ class StripeWH_Handler:
             billing_details = intent.charges.data[0].billing_details
 
         shipping_details = intent.shipping
-        grand_total = round(intent.amount / 100, 2)
 
         # Clean data in the shipping details
         for field, value in shipping_details.address.items():
@@ -101,79 +89,46 @@ class StripeWH_Handler:
             except User.DoesNotExist:
                 email = None
 
-        order_exists = False
-        attempt = 1
-        while attempt <= 5:
+        # The checkout view usually creates the order before this webhook
+        # arrives. stripe_pid is unique, so if both run at the same time
+        # the loser of the insert gets the winner's order, not a duplicate.
+        order = Order.objects.filter(stripe_pid=pid).first()
+        created = order is None
+        if created:
             try:
-                order = Order.objects.get(
-                    full_name__iexact=shipping_details.name,
-                    email__iexact=email,
-                    phone_number__iexact=shipping_details.phone,
-                    country__iexact=shipping_details.address.country,
-                    postcode__iexact=shipping_details.address.postal_code,
-                    town_or_city__iexact=shipping_details.address.city,
-                    street_address1__iexact=shipping_details.address.line1,
-                    street_address2__iexact=shipping_details.address.line2,
-                    county__iexact=shipping_details.address.state,
-                    grand_total=grand_total,
-                    original_cart=cart,
-                    stripe_pid=pid,
+                order = create_order(
+                    Order(
+                        stripe_pid=pid,
+                        full_name=shipping_details.name,
+                        user_profile=profile,
+                        email=email,
+                        phone_number=shipping_details.phone,
+                        country=shipping_details.address.country,
+                        postcode=shipping_details.address.postal_code,
+                        town_or_city=shipping_details.address.city,
+                        street_address1=shipping_details.address.line1,
+                        street_address2=shipping_details.address.line2,
+                        county=shipping_details.address.state,
+                        original_cart=cart,
+                    ),
+                    json.loads(cart),
                 )
-                order_exists = True
-                break
-            except Order.DoesNotExist:
-                attempt += 1
-                time.sleep(1)
-
-        if order_exists:
-            self._send_confirmation_email(order)
-            return HttpResponse(
-                content=(
-                    f'Webhook received: {event["type"]} | SUCCESS: '
-                    "Verified order already in database"
-                ),
-                status=200,
-            )
-        else:
-            order = None
-            try:
-                order = Order.objects.create(
-                    full_name=shipping_details.name,
-                    user_profile=profile,
-                    email=email,
-                    phone_number=shipping_details.phone,
-                    country=shipping_details.address.country,
-                    postcode=shipping_details.address.postal_code,
-                    town_or_city=shipping_details.address.city,
-                    street_address1=shipping_details.address.line1,
-                    street_address2=shipping_details.address.line2,
-                    county=shipping_details.address.state,
-                    grand_total=grand_total,
-                    original_cart=cart,
-                    stripe_pid=pid,
-                )
-                for item_id, quantity in json.loads(cart).items():
-                    book = Book.objects.get(id=item_id)
-                    order_line_item = OrderLineItem(
-                        order=order,
-                        book=book,
-                        quantity=quantity,
-                    )
-                    order_line_item.save()
+            except IntegrityError:
+                order = Order.objects.get(stripe_pid=pid)
+                created = False
             except Exception as e:
-                if order:
-                    order.delete()
                 return HttpResponse(
                     content=f'Webhook received: {event["type"]} | ERROR: {e}',
                     status=500,
                 )
 
         self._send_confirmation_email(order)
+        if created:
+            result = "Created order in webhook"
+        else:
+            result = "Verified order already in database"
         return HttpResponse(
-            content=(
-                f'Webhook received: {event["type"]} | SUCCESS: '
-                "Created order in webhook"
-            ),
+            content=f'Webhook received: {event["type"]} | SUCCESS: {result}',
             status=200,
         )
 
@@ -1,10 +1,147 @@
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
 from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import ManifestFilesMixin
+from django.core.files.base import ContentFile, File
+from django.utils import timezone
+from django.utils.functional import cached_property
 from storages.backends.s3boto3 import S3Boto3Storage
 
+# Content hashes of the unprocessed files of the last collectstatic.
+# The manifest has the hashes of the processed files, which differ for
+# CSS files that refer to other files with url()
+SOURCES_NAME = "staticfiles-sources.json"
+
+# Names written by ManifestFilesMixin end in a 12 digit content hash,
+# e.g. css/base.0123456789ab.css
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}(\.[^./]+)?$")
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class StaticStorage(ManifestFilesMixin, S3Boto3Storage):
+    """
+    Static files under content-hashed names, uploaded incrementally.
+
+    The manifest left by the previous collectstatic says which files are
+    already in the bucket: files whose content hash has not changed are
+    neither checked with a request nor uploaded again, and the rest are
+    uploaded concurrently. Hashed names never change content, so they
+    are served as immutable.
+
+    Templates must only refer to files that exist: like every
+    ManifestFilesMixin storage, a {% static %} name missing from the
+    manifest raises ValueError.
+    """
 
-class StaticStorage(S3Boto3Storage):
     location = settings.STATICFILES_LOCATION
     default_acl = 'public-read'
+    upload_threads = 16
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Original name -> hashed name, as of the last collectstatic
+        self.uploaded_files = dict(self.hashed_files)
+        self.uploaded_hashed_names = set(self.uploaded_files.values())
+        self._executor = None
+        self._uploads = []
+        self._post_processing = False
+
+    def get_object_parameters(self, name):
+        params = super().get_object_parameters(name)
+        if HASHED_NAME_RE.search(name):
+            params["CacheControl"] = "public, max-age=31536000, immutable"
+        else:
+            # Unhashed names and the manifest change in place
+            params.pop("Expires", None)
+            params["CacheControl"] = "no-cache"
+        return params
+
+    @cached_property
+    def source_hashes(self):
+        """Name -> content hash of the sources of the last collectstatic"""
+        try:
+            with self.open(SOURCES_NAME) as f:
+                return json.loads(f.read().decode())
+        except (OSError, ValueError):
+            return {}
+
+    def is_unchanged(self, name):
+        """Whether the local source of an uploaded file matches the upload"""
+        path = finders.find(name)
+        if not path or name not in self.source_hashes:
+            return False
+        with open(path, "rb") as f:
+            return self.file_hash(name, File(f)) == self.source_hashes[name]
+
+    def exists(self, name):
+        if name in self.uploaded_hashed_names or name in self.uploaded_files:
+            return True
+        return super().exists(name)
+
+    def get_modified_time(self, name):
+        # collectstatic skips files that are newer in the bucket than
+        # locally. A fresh checkout makes every local file look newer, so
+        # compare content instead
+        if name in self.uploaded_files:
+            return timezone.now() if self.is_unchanged(name) else EPOCH
+        return super().get_modified_time(name)
+
+    def _is_reupload(self, name):
+        # post_process deletes and saves again the hashed names of CSS
+        # files on every pass. The same hashed name means the same
+        # content, so that would only make the file briefly unavailable
+        return self._post_processing and name in self.uploaded_hashed_names
+
+    def delete(self, name):
+        if not self._is_reupload(name):
+            super().delete(name)
+
+    def _save(self, name, content):
+        if self._is_reupload(name):
+            return name
+        if name == self.manifest_name:
+            # Only publish the manifest once everything it lists is there
+            self.wait_for_uploads()
+            return super()._save(name, content)
+
+        if HASHED_NAME_RE.search(name):
+            self.uploaded_hashed_names.add(name)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.upload_threads)
+        # The caller closes its file as soon as save() returns
+        content = ContentFile(content.read())
+        self._uploads.append(self._executor.submit(super()._save, name, content))
+        return name
+
+    def wait_for_uploads(self):
+        """Block until the queued uploads finish, raising the first error"""
+        uploads, self._uploads = self._uploads, []
+        for upload in uploads:
+            upload.result()
+
+    def post_process(self, paths, dry_run=False, **options):
+        # Hashing may read the originals back from the bucket
+        self.wait_for_uploads()
+        source_hashes = {}
+        for name, (storage, path) in paths.items():
+            with storage.open(path) as f:
+                source_hashes[name] = self.file_hash(name, f)
+
+        self._post_processing = True
+        try:
+            yield from super().post_process(paths, dry_run, **options)
+        finally:
+            self._post_processing = False
+        if not dry_run:
+            self.source_hashes = source_hashes
+            self._save(
+                SOURCES_NAME, ContentFile(json.dumps(source_hashes).encode())
+            )
+        self.wait_for_uploads()
 
 
 class MediaStorage(S3Boto3Storage):
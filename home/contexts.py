@@ -0,0 +1,24 @@
+from django.contrib.auth.models import AnonymousUser
+from cart.contexts import LazyValue, get_cart_summary
+
+
+def header(request):
+    """
+    The visitor shown in the page header. Pages from the page cache
+    (see books.page_cache) are rendered for an anonymous visitor with an
+    empty cart, and fill in the real ones from home.views.header.
+    """
+    if getattr(request, "header_deferred", False):
+        return {
+            "header_deferred": True,
+            "header_user": AnonymousUser(),
+            "header_grand_total": 0,
+        }
+
+    return {
+        "header_deferred": False,
+        "header_user": request.user,
+        "header_grand_total": LazyValue(
+            lambda: get_cart_summary(request).grand_total
+        ),
+    }
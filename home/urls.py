@@ -1,4 +1,7 @@
 from django.urls import path
 from . import views
 
-urlpatterns = [path("", views.index, name="home")]
+urlpatterns = [
+    path("", views.index, name="home"),
+    path("header/", views.header, name="header_fragment"),
+]
@@ -1,96 +1,84 @@
 from django.shortcuts import render, redirect
-from django.db.models import Q
 from django.contrib import messages
+from django.http import JsonResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
 from django.urls import reverse
-from books.models import Book, Category
-import re
+from django.utils.html import escape
+from django.views.decorators.cache import never_cache
+from books.catalog import CatalogQuery, InvalidCatalogQuery
+from books.category_tree import CategoryTree
+from books.facets import Facets
+from books.page_cache import cache_shared_page
+from books.pagination import InvalidCursor, get_next_page_url
 
 
+@cache_shared_page
 def index(request):
-    books = Book.objects.all()
-    query = None
-    categories = None
-
-    if request.GET:
-        if "subcategory" in request.GET and "parent" in request.GET:
-            try:
-                subcategory_id = int(request.GET["subcategory"])
-                parent_id = int(request.GET["parent"])
-                books = books.filter(
-                    categories__id=subcategory_id, categories__parent_id=parent_id
-                )
-                categories = Category.objects.filter(id=subcategory_id)
-            except ValueError:
-                messages.error(request, "Invalid category selection")
-                return redirect(reverse("books"))
-
-        elif "category" in request.GET:
-            try:
-                category_ids = [int(cid) for cid in request.GET["category"].split(",")]
-
-                # Get all subcategories where parent is in category_ids
-                subcategory_ids = Category.objects.filter(
-                    parent_id__in=category_ids
-                ).values_list("id", flat=True)
-
-                # Get books tagged with any of those subcategories
-                books = books.filter(categories__id__in=subcategory_ids)
-
-                categories = Category.objects.filter(id__in=category_ids)
-
-            except ValueError:
-                messages.error(request, "Invalid category selection")
-                return redirect(reverse("books"))
-
-        if "q" in request.GET:
-            query = request.GET["q"]
-            if not query.strip():
-                messages.error(request, "Enter the search criteria")
-                return redirect(reverse("books"))
-
-            # Split query into individual words
-            words = query.strip().split()
-            words = re.findall(r"\w+", query.lower())
-
-            # Build a combined Q object that requires each word to match
-            # at least one field
-            for word in words:
-                word_queries = (
-                    Q(title__icontains=word)
-                    | Q(description__icontains=word)
-                    | Q(authors__name__icontains=word)
-                    | Q(publisher__name__icontains=word)
-                )
-
-                books = books.filter(word_queries)
-
-    sort_option = request.GET.get("sort")
-
-    if sort_option == "price_asc":
-        books = books.order_by("price")
-    elif sort_option == "price_desc":
-        books = books.order_by("-price")
-
-    language = request.GET.get("language")
-    if language in ["ukr", "eng"]:
-        books = books.filter(language=language)
-
-    active_categories = Category.objects.filter(parent=None, active=True).order_by(
-        "order"
-    )
-    for category in active_categories:
-        category.visible_subcategories = category.subcategories.filter(
-            active=True
-        ).order_by("order")
-
+    try:
+        catalog = CatalogQuery(request.GET)
+    except InvalidCatalogQuery as e:
+        messages.error(request, str(e))
+        return redirect(reverse("books"))
+
+    try:
+        books, next_cursor = catalog.paginate(request.GET.get("cursor"))
+    except InvalidCursor:
+        messages.error(request, "Invalid page")
+        return redirect(reverse("home"))
+
+    categories = CategoryTree.get()
     context = {
         "books": books,
-        "search_term": query,
-        "current_categories": categories,
-        "categories": active_categories,
-        "sort_option": sort_option,
-        "language": language,
+        "search_term": catalog.search_term,
+        "fuzzy_search": catalog.fuzzy,
+        "current_categories": catalog.current_categories,
+        "categories": categories,
+        "facets": Facets.get(catalog, categories),
+        "sort_option": catalog.sort_option,
+        "language": catalog.language,
+        "next_cursor": next_cursor,
+        "next_page_url": get_next_page_url(request, next_cursor),
         "show_carousel": True,
     }
 
     return render(request, "home/index.html", context)
+
+
+@never_cache
+def header(request):
+    """
+    The parts of the page that differ between visitors, for pages
+    served from the page cache to fill in (see templates/base.html)
+    """
+
+    def fragment(template, **context):
+        return render_to_string(f"includes/{template}", context, request=request)
+
+    user = request.user
+    return JsonResponse(
+        {
+            "fragments": {
+                "account-label": escape(user.get_username() or "Login"),
+                "account-menu": fragment(
+                    "header/account_menu.html", item_class="dropdown-item"
+                ),
+                "account-menu-md": fragment(
+                    "header/account_menu.html", item_class="dropdown-item nav-text"
+                ),
+                "cart-link": fragment(
+                    "header/cart_link.html",
+                    icon_class="fas fa-shopping-bag fa-lg",
+                    text_class="my-0 ml-1",
+                ),
+                "cart-link-md": fragment(
+                    "header/cart_link.html",
+                    icon_class="fas fa-shopping-bag fa-lg mr-2",
+                    text_class="my-0 nav-text",
+                ),
+                "messages": fragment("messages.html"),
+            },
+            "is_superuser": user.is_superuser,
+            "csrf_token": get_token(request),
+        }
+    )
@@ -0,0 +1,13 @@
+from django.contrib import admin
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("task", "status", "attempts", "run_at", "created", "finished_at")
+    list_filter = ("status", "task")
+    search_fields = ("task", "last_error")
+    readonly_fields = ("created", "started_at", "finished_at", "last_error")
+    ordering = ("-created",)
+
+
+admin.site.register(Job, JobAdmin)
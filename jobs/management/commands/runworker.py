@@ -0,0 +1,82 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections, connection
+
+from jobs.queue import claim_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=4,
+            help="Number of worker threads (default 4)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait when the queue is empty (default 1)",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for jobs",
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale jobs")
+
+        workers = [
+            threading.Thread(
+                target=self.work,
+                args=(options["poll_interval"], options["burst"]),
+                name=f"jobs-worker-{number}",
+            )
+            for number in range(options["threads"])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} worker threads")
+
+        for worker in workers:
+            worker.join()
+        self.stdout.write("Workers stopped")
+
+    def stop(self, signum, frame):
+        # Running jobs are finished before the threads exit
+        self.stdout.write("Stopping workers...")
+        self.stopping.set()
+
+    def work(self, poll_interval, burst):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    job = claim_job()
+                except DatabaseError as e:
+                    self.stderr.write(f"Could not claim a job: {e}")
+                    self.stopping.wait(poll_interval)
+                    continue
+
+                if job is None:
+                    if burst:
+                        break
+                    self.stopping.wait(poll_interval)
+                    continue
+
+                status = run_job(job)
+                self.stdout.write(f"Job {job.pk} {job.task}: {status}")
+        finally:
+            connection.close()
@@ -0,0 +1,114 @@
+"""
+A small job queue stored in the database.
+
+Request handlers call enqueue() and return; `manage.py runworker`
+claims queued jobs and runs them. Claiming uses
+SELECT ... FOR UPDATE SKIP LOCKED where the database supports it, and
+a conditional UPDATE everywhere, so several workers never run the same
+job. Failed jobs are retried with exponential backoff.
+"""
+
+import logging
+import traceback
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_BASE_DELAY = 10
+RETRY_MAX_DELAY = 60 * 60
+# A job running for longer than this is assumed to belong to a dead worker
+RUNNING_TIMEOUT = timedelta(minutes=30)
+
+
+def enqueue(task, *args, max_attempts=5, delay=None, **kwargs):
+    """
+    Queue a call of task(*args, **kwargs). The task is a module-level
+    function or its dotted path, and the arguments must be JSON
+    serializable, e.g. primary keys rather than model instances.
+    """
+    if callable(task):
+        task = f"{task.__module__}.{task.__qualname__}"
+    run_at = timezone.now() + (delay or timedelta())
+    return Job.objects.create(
+        task=task,
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=max_attempts,
+        run_at=run_at,
+    )
+
+
+def claim_job():
+    """Mark the next due job as running and return it, or None"""
+    now = timezone.now()
+    # Without SKIP LOCKED (SQLite) the conditional update below is the
+    # only guard, and a read-then-write transaction would just add lock
+    # contention between workers
+    if connection.features.has_select_for_update_skip_locked:
+        atomic = transaction.atomic()
+    else:
+        atomic = nullcontext()
+
+    with atomic:
+        job = (
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by("run_at", "pk")
+            .first()
+        )
+        if job is None:
+            return None
+
+        claimed = Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, attempts=job.attempts + 1, started_at=now
+        )
+        if not claimed:
+            # Another worker took it first
+            return None
+
+    job.status = Job.RUNNING
+    job.attempts += 1
+    job.started_at = now
+    return job
+
+
+def retry_delay(attempts):
+    """Exponential backoff: 10s, 20s, 40s, ... up to an hour"""
+    seconds = RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, RETRY_MAX_DELAY))
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome"""
+    try:
+        task = import_string(job.task)
+        task(*job.args, **job.kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+            logger.warning("Job %s failed, retrying at %s", job.pk, job.run_at)
+        else:
+            job.status = Job.FAILED
+            logger.error("Job %s failed permanently", job.pk)
+    else:
+        job.status = Job.DONE
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "run_at", "finished_at", "last_error"])
+    return job.status
+
+
+def requeue_stale_jobs():
+    """Return jobs left running by a worker that died to the queue"""
+    return Job.objects.filter(
+        status=Job.RUNNING, started_at__lt=timezone.now() - RUNNING_TIMEOUT
+    ).update(status=Job.QUEUED)
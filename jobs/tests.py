@@ -0,0 +1,157 @@
+import signal
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from .models import Job
+from .queue import (
+    RETRY_MAX_DELAY,
+    RUNNING_TIMEOUT,
+    claim_job,
+    enqueue,
+    requeue_stale_jobs,
+    retry_delay,
+    run_job,
+)
+
+calls = []
+
+
+def record(*args, **kwargs):
+    calls.append((args, kwargs))
+
+
+def fail():
+    raise ValueError("task failed")
+
+
+class QueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_stores_the_call(self):
+        job = enqueue(record, 1, "two", key=3)
+        job.refresh_from_db()
+        self.assertEqual(job.task, "jobs.tests.record")
+        self.assertEqual((job.args, job.kwargs), ([1, "two"], {"key": 3}))
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 0))
+        self.assertLessEqual(job.run_at, timezone.now())
+
+    def test_enqueue_with_delay(self):
+        job = enqueue("jobs.tests.record", delay=timedelta(minutes=5))
+        self.assertGreater(job.run_at, timezone.now() + timedelta(minutes=4))
+        self.assertIsNone(claim_job())
+
+    def test_claim_takes_due_jobs_in_order(self):
+        later = enqueue(record, "later")
+        first = enqueue(record, "first")
+        Job.objects.filter(pk=first.pk).update(
+            run_at=later.run_at - timedelta(seconds=1)
+        )
+
+        job = claim_job()
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual((job.status, job.attempts), (Job.RUNNING, 1))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts), (Job.RUNNING, 1))
+
+        self.assertEqual(claim_job().pk, later.pk)
+        self.assertIsNone(claim_job())
+
+    def test_run_job_calls_the_task(self):
+        enqueue(record, 1, key="value")
+        job = claim_job()
+        self.assertEqual(run_job(job), Job.DONE)
+        self.assertEqual(calls, [((1,), {"key": "value"})])
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_failed_job_is_retried_with_backoff_until_max_attempts(self):
+        job = enqueue(fail, max_attempts=3)
+        for attempt, delay in ((1, 10), (2, 20)):
+            with self.subTest(attempt=attempt):
+                before = timezone.now()
+                with self.assertLogs("jobs.queue", "WARNING"):
+                    self.assertEqual(run_job(claim_job()), Job.QUEUED)
+                job.refresh_from_db()
+                self.assertEqual(job.attempts, attempt)
+                self.assertIn("task failed", job.last_error)
+                self.assertGreaterEqual(job.run_at, before + timedelta(seconds=delay))
+                # Not due until the backoff has passed
+                self.assertIsNone(claim_job())
+                Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+
+        with self.assertLogs("jobs.queue", "ERROR"):
+            self.assertEqual(run_job(claim_job()), Job.FAILED)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 3))
+        self.assertIsNone(claim_job())
+
+    def test_retry_delay_is_capped(self):
+        self.assertEqual(retry_delay(1), timedelta(seconds=10))
+        self.assertEqual(retry_delay(4), timedelta(seconds=80))
+        self.assertEqual(retry_delay(30), timedelta(seconds=RETRY_MAX_DELAY))
+
+    def test_requeue_stale_jobs(self):
+        stale = enqueue(record)
+        running = enqueue(record)
+        claim_job()
+        claim_job()
+        Job.objects.filter(pk=stale.pk).update(
+            started_at=timezone.now() - RUNNING_TIMEOUT - timedelta(minutes=1)
+        )
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        stale.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(stale.status, Job.QUEUED)
+        self.assertEqual(running.status, Job.RUNNING)
+        self.assertEqual(claim_job().pk, stale.pk)
+
+
+class RunWorkerTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def runworker(self):
+        stdout = StringIO()
+        # The command handles SIGINT and SIGTERM, which the test runner
+        # should keep
+        with mock.patch.object(signal, "signal"):
+            call_command("runworker", "--burst", "--threads", "1", stdout=stdout)
+        return stdout.getvalue()
+
+    def test_burst_runs_the_queue_and_exits(self):
+        done = enqueue(record, "done")
+        failed = enqueue(fail, max_attempts=1)
+        retried = enqueue(fail)
+        later = enqueue(record, delay=timedelta(hours=1))
+        stale = enqueue(record, "stale")
+        Job.objects.filter(pk=stale.pk).update(
+            status=Job.RUNNING,
+            attempts=1,
+            started_at=timezone.now() - RUNNING_TIMEOUT - timedelta(minutes=1),
+        )
+
+        with self.assertLogs("jobs.queue", "WARNING"):
+            output = self.runworker()
+
+        self.assertIn("Requeued 1 stale jobs", output)
+        statuses = dict(Job.objects.values_list("pk", "status"))
+        self.assertEqual(
+            statuses,
+            {
+                done.pk: Job.DONE,
+                failed.pk: Job.FAILED,
+                retried.pk: Job.QUEUED,
+                later.pk: Job.QUEUED,
+                stale.pk: Job.DONE,
+            },
+        )
+        self.assertEqual(sorted(calls), [(("done",), {}), (("stale",), {})])
+        self.assertEqual(Job.objects.get(pk=stale.pk).attempts, 2)